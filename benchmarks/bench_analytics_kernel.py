@@ -0,0 +1,25 @@
+import timeit
+from src.Analytics import *
+from benchmarks.bench_history_memory import daily_history
+
+
+def separate_calls(habit: Habit) -> tuple:
+    """ Calculates the analytics with the separate streak, break and stats calls"""
+    return habit.habit_streak() + habit.habit_breaks() + habit.habit_stats()
+
+
+def main() -> None:
+    """ Prints the time per habit for the separate calls and the single metrics call"""
+    for years in [1, 10, 30]:
+        history = daily_history(365 * years)
+        habit = Habit("bench", history = history, creation_date = history[:10])
+        n = 10000
+        t_separate = timeit.timeit(lambda: separate_calls(habit), number = n) / n
+        t_metrics = timeit.timeit(lambda: habit.habit_metrics(), number = n) / n
+        t_cold = timeit.timeit(lambda: Habit("bench", history = history).habit_metrics(), number = 5) / 5
+        print(f"{years:>3} years daily: separate calls {t_separate * 1e6:8.2f} us, "
+              f"habit_metrics {t_metrics * 1e6:8.2f} us, load + habit_metrics {t_cold * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
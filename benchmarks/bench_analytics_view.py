@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+from src.HabitManager import *
+from src.Analytics import *
+from benchmarks.bench_query import build_database
+
+
+def sort_and_filter(habit_manager: HabitManager) -> dict:
+    """ Sorts all habits by streak, filters them once per periodicity and builds each table,
+    the way the analytics view did before"""
+    habit_list = list(habit_manager.habits.values())
+    habit_sorted = sorted(habit_list, key = lambda x: analytics_cache.habit_metrics(x).current_streak, reverse = True)
+    tables = {}
+    for periodicity in HabitPeriods:
+        names = list_habit_with_periodicity(habit_sorted, periodicity)
+        tables[periodicity] = list_habit_analytics_table(habit_manager.data_as_dict(), names)
+    return tables
+
+
+def query_indexes(habit_manager: HabitManager) -> dict:
+    """ Lists each periodicity by streak from the indexes of the habit manager, then builds each table"""
+    return {periodicity: list_habit_analytics_table(habit_manager.data_as_dict(),
+                                                    habit_manager.query(periodicity, order_by = 'streak'))
+            for periodicity in HabitPeriods}
+
+
+def single_pass(habit_manager: HabitManager) -> dict:
+    """ Builds all tables in a single pass"""
+    return habit_analytics_tables(habit_manager.data_as_dict().values())
+
+
+def numpy_batch(habit_manager: HabitManager) -> dict:
+    """ Builds all tables with the numpy batch analytics"""
+    batch = batch_habit_analytics(habit_manager.data_as_dict().values())
+    return {periodicity: batch_analytics_table(batch[periodicity]) for periodicity in HabitPeriods}
+
+
+def main(n_habits: int = 10000, n_days: int = 365) -> None:
+    """ Prints the time of building the tables of the analytics view, with the metrics of every habit
+    calculated from scratch"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, n_days)
+        habit_manager = HabitManager(db_name)
+        habit_manager.load_habits_from_db()
+        paths = [sort_and_filter, query_indexes, single_pass]
+        if is_batch_analytics_available():
+            paths.append(numpy_batch)
+        expected = None
+        for path in paths:
+            # new habit objects and an empty cache, so no metrics or decoded histories are reused
+            analytics_cache.clear()
+            habit_manager.load_habits_from_db()
+            start = time.perf_counter()
+            tables = path(habit_manager)
+            elapsed = time.perf_counter() - start
+            expected = expected or tables
+            same = all(tables[periodicity] == expected[periodicity] for periodicity in HabitPeriods)
+            print(f"{path.__name__:>15}: {elapsed:6.3f} s for {n_habits} habits, same tables: {same}")
+        habit_manager.close()
+
+
+if __name__ == "__main__":
+    # the number of habits and days can be given as arguments, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:3]])
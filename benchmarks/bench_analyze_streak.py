@@ -0,0 +1,19 @@
+import time
+from datetime import timedelta
+from src.Analytics import *
+
+
+def main() -> None:
+    """ Prints the time of the functional streak and break analysis on long daily histories"""
+    start = datetime(1700, 1, 1)
+    for n_days in [1000, 10000, 100000]:
+        h_dates = [start + timedelta(days = x) for x in range(n_days) if x % 10 != 9]
+        begin = time.perf_counter()
+        analyze_streak(h_dates[0:-1], h_dates[-1], HabitPeriods.DAILY)
+        analyze_breaks(h_dates[0:-1], h_dates[-1], HabitPeriods.DAILY)
+        elapsed = time.perf_counter() - begin
+        print(f"{len(h_dates):>6} check-offs: analyze_streak + analyze_breaks {elapsed * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import time
+from src.Analytics import *
+from benchmarks.bench_history_memory import daily_history
+
+
+def load_habits(n_habits: int, history: str) -> list:
+    """ Builds habits the way they are loaded from the database, with the history not decoded yet"""
+    habits = []
+    for x in range(n_habits):
+        habit = Habit(f"habit {x}", periodicity = list(HabitPeriods)[x % 4], creation_date = history[:10])
+        habit.set_history(history, lazy = True)
+        habits.append(habit)
+    return habits
+
+
+def main() -> None:
+    """ Prints the time of the analytics of all freshly loaded habits, one by one and as a batch"""
+    history = daily_history(3 * 365)
+    today = datetime.now().toordinal()
+    for n_habits in [1000, 10000]:
+        habits = load_habits(n_habits, history)
+        start = time.perf_counter()
+        for habit in habits:
+            habit.habit_metrics(today)
+        t_loop = time.perf_counter() - start
+
+        habits = load_habits(n_habits, history)
+        start = time.perf_counter()
+        batch_habit_analytics(habits, today)
+        t_batch = time.perf_counter() - start
+
+        print(f"{n_habits:>6} habits x {3 * 365} days: habit_metrics loop {t_loop * 1e3:8.1f} ms, "
+              f"batch_habit_analytics {t_batch * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
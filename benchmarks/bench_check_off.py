@@ -0,0 +1,62 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from src.HabitManager import *
+
+
+def build_manager(db_name: str, n_habits: int) -> HabitManager:
+    """ Builds a habit manager with daily habits, none of them checked off yet
+
+    :param str db_name: Name of the database file
+    :param int n_habits: number of habits
+    :return: habit manager with the habits loaded
+    :rtype: HabitManager
+    """
+    initialize_database(db_name)
+    today = datetime.now().strftime('%Y-%m-%d')
+    with sqlite3.connect(db_name) as con:
+        con.executemany("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) VALUES(?, ?, ?, ?)",
+                        ((f"habit {x}", "", 'daily', today) for x in range(n_habits)))
+    con.close()
+    habit_manager = HabitManager(db_name)
+    habit_manager.load_habits_from_db()
+    return habit_manager
+
+
+def check_off_one_by_one(habit_manager: HabitManager, db_name: str, habit_list: list) -> None:
+    """ Checks off the habits one at a time, the way it was done before"""
+    for habit_name in habit_list:
+        if habit_name in habit_manager.habits and is_habit_exists(db_name, habit_name):
+            habit_obj = habit_manager.habits[habit_name]
+            habit_obj.check_off()
+            update_habit_history(db_name, habit_obj)
+
+
+def main(n_habits: int = 10000) -> None:
+    """ Prints the time of checking off all habits one by one, and in a single batch"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'one_by_one.db')
+        habit_manager = build_manager(db_name, n_habits)
+        habit_list = list(habit_manager.habits)
+        start = time.perf_counter()
+        check_off_one_by_one(habit_manager, db_name, habit_list)
+        t_single = time.perf_counter() - start
+        habit_manager.close()
+
+        db_name = os.path.join(tmp, 'batch.db')
+        habit_manager = build_manager(db_name, n_habits)
+        start = time.perf_counter()
+        habit_manager.check_off_habits(habit_list)
+        t_batch = time.perf_counter() - start
+        habit_manager.close()
+
+    print(f"{n_habits} habits: one by one {t_single:6.2f} s ({n_habits / t_single:9.0f} habits/s), "
+          f"batch {t_batch:6.3f} s ({n_habits / t_batch:9.0f} habits/s)")
+
+
+if __name__ == "__main__":
+    # the number of habits can be given as an argument, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from src.Database import *
+
+
+def main(n_writes: int = 2000) -> None:
+    """ Prints the write and read throughput of the database for each tuning profile"""
+    days = [(date(2000, 1, 1) + timedelta(days = x)).isoformat() for x in range(n_writes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in TUNING_PROFILES:
+            db_name = os.path.join(tmp, f'{profile}.db')
+            with HabitDatabase(db_name, profile) as database:
+                database.initialize()
+                for x in range(100):
+                    database.add_habit(Habit(f"habit {x}", creation_date = '2000-01-01'))
+
+                # every check off is its own transaction, the way the application writes
+                start = time.perf_counter()
+                for x, day in enumerate(days):
+                    database.add_checkoff(f"habit {x % 100}", day)
+                t_write = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for x in range(n_writes):
+                    database.is_habit_exists(f"habit {x % 100}")
+                t_lookup = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(20):
+                    database.load_habit_history()
+                t_load = time.perf_counter() - start
+
+            print(f"{profile:>8}: {n_writes / t_write:9.0f} check offs/s, {n_writes / t_lookup:9.0f} lookups/s, "
+                  f"{20 / t_load:7.1f} history loads/s")
+
+
+if __name__ == "__main__":
+    # the number of writes can be given as an argument, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,48 @@
+import time
+from src.Analytics import *
+from benchmarks.bench_history_memory import daily_history
+
+
+def build_habits(n_habits: int) -> dict:
+    """ Builds a dictionary of habits with all periodicities, each with a month of daily history
+
+    :param int n_habits: number of habits
+    :return: dictionary of habit objects
+    :rtype: dict
+    """
+    history = daily_history(30)
+    periods = list(HabitPeriods)
+    habits = {}
+    for x in range(n_habits):
+        habit = Habit(f"habit {x}", periodicity = periods[x % 4], creation_date = history[:10])
+        if periods[x % 4] == HabitPeriods.DAILY:
+            habit.set_history(history, lazy = True)
+        habits[habit.name] = habit
+    return habits
+
+
+def main() -> None:
+    """ Prints the time of the listing functions, for a growing number of habits"""
+    for n_habits in [1000, 10000, 100000]:
+        habits = build_habits(n_habits)
+        habit_list = list(habits.values())
+        names = list_currently_tracked_habits(habit_list)
+        timings = {
+            'tracked': lambda: list_currently_tracked_habits(habit_list),
+            'unchecked': lambda: list_currently_unchecked_habits(habit_list),
+            'checked': lambda: list_currently_checked_habits(habit_list),
+            'periodicity': lambda: list_habit_with_periodicity(habit_list, HabitPeriods.WEEKLY),
+            'info': lambda: list_habit_info(habits, names),
+            'analytics': lambda: list_habit_analytics(habits, names),
+            'analytics table': lambda: list_habit_analytics_table(habits, names),
+        }
+        results = []
+        for label, func in timings.items():
+            start = time.perf_counter()
+            func()
+            results.append(f"{label} {(time.perf_counter() - start) * 1e3:7.1f} ms")
+        print(f"{n_habits:>6} habits: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    main()
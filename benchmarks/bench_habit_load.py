@@ -0,0 +1,55 @@
+import os
+import sys
+import resource
+import subprocess
+import tempfile
+import time
+from itertools import groupby
+from src.HabitManager import *
+from benchmarks.bench_history_load import build_database
+
+
+def load_two_queries(habit_manager: HabitManager) -> None:
+    """ Loads the habits with one query for the data and one for the history, each read with fetchall
+    and joined in python, the way it was done before"""
+    con = habit_manager.database.connection
+    habit_manager.habits = {}
+    for data in con.execute("SELECT habit_name, descr, periodicity, creation_date FROM HabitData").fetchall():
+        habit_manager.habits[data[0]] = Habit(data[0], data[1], HabitPeriods(data[2]), data[3])
+    rows = con.execute("SELECT d.habit_name, c.period_date FROM HabitCheckoff c JOIN HabitData d USING (habit_id) "
+                       "ORDER BY d.habit_name, c.period_date").fetchall()
+    for name, habit_rows in groupby(rows, key = lambda row: row[0]):
+        if name in habit_manager.habits:
+            habit_manager.habits[name].set_history(','.join([row[1] for row in habit_rows]), lazy = True)
+
+
+def run(loader: str, db_name: str) -> None:
+    """ Loads the habits with the given loader, and prints the load time and the peak memory of the process"""
+    habit_manager = HabitManager(db_name)
+    start = time.perf_counter()
+    if loader == 'two queries':
+        load_two_queries(habit_manager)
+    else:
+        habit_manager.load_habits_from_db()
+    t_load = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{loader:>12}: {len(habit_manager.habits)} habits in {t_load:6.2f} s, peak RSS {peak:7.1f} MB")
+    habit_manager.close()
+
+
+def main(n_habits: int = 100000, n_days: int = 30) -> None:
+    """ Prints the load time and peak memory of each loader, each in a fresh process"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, n_days)
+        for loader in ['two queries', 'streaming']:
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_habit_load', '--run', loader, db_name],
+                           check = True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(sys.argv[2], sys.argv[3])
+    else:
+        # the number of habits and days can be given as arguments, for a quicker run
+        main(*[int(arg) for arg in sys.argv[1:3]])
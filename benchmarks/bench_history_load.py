@@ -0,0 +1,63 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+from array import array
+from src.HabitManager import *
+from benchmarks.bench_history_memory import daily_history
+
+
+def build_database(db_name: str, n_habits: int, n_days: int) -> None:
+    """ Builds a database of daily habits, all with the same number of check-offs
+
+    :param str db_name: Name of the database file
+    :param int n_habits: number of habits
+    :param int n_days: number of daily check-offs of each habit
+    :return: the function returns nothing
+    """
+    initialize_database(db_name)
+    history = daily_history(n_days)
+    with sqlite3.connect(db_name) as con:
+        con.executemany("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) VALUES(?, ?, ?, ?)",
+                        ((f"habit {x}", "", 'daily', history[:10]) for x in range(n_habits)))
+        days = history.split(',')
+        con.executemany("INSERT INTO HabitCheckoff VALUES(?, ?)",
+                        ((x + 1, day) for x in range(n_habits) for day in days))
+    con.close()
+
+
+def strptime_history(history: str) -> array:
+    """ Parses the history with datetime.strptime, the way it was done before"""
+    return array('i', [datetime.strptime(day, '%Y-%m-%d').toordinal() for day in history.split(',')])
+
+
+def main(n_habits: int = 10000, n_days: int = 3 * 365) -> None:
+    """ Prints the load time of a database with the strptime parser and the fast parser"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, n_days)
+        histories = [history for _, history in load_habit_history(db_name)]
+
+        start = time.perf_counter()
+        for history in histories:
+            strptime_history(history)
+        t_strptime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for history in histories:
+            parse_history(history)
+        t_fast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        habit_manager = HabitManager(db_name)
+        habit_manager.load_habits_from_db()
+        t_load = time.perf_counter() - start
+
+    print(f"{n_habits} habits x {n_days} days: strptime parsing {t_strptime:6.2f} s, "
+          f"fast parsing {t_fast:6.2f} s, load_habits_from_db {t_load:6.2f} s")
+
+
+if __name__ == "__main__":
+    # the number of habits can be given as an argument, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,57 @@
+import tracemalloc
+from datetime import datetime, timedelta
+from src.Habit import *
+
+
+def daily_history(n_days: int) -> str:
+    """ Builds a history string of consecutive daily check-offs, up to today
+
+    :param int n_days: number of check-offs
+    :return: history as a string in "%Y-%m-%d,%Y-%m-%d" format
+    :rtype: str
+    """
+    start = datetime.now() - timedelta(days = n_days - 1)
+    return ','.join([(start + timedelta(days = x)).strftime('%Y-%m-%d') for x in range(n_days)])
+
+
+def measure(build) -> int:
+    """ Measures the memory retained by the object returned from the given function
+
+    :param build: function building the object to be measured
+    :return: number of bytes allocated and still alive after building
+    :rtype: int
+    """
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def list_history(history: str) -> list:
+    """ Builds the history the way it was stored before, as a list of datetime objects"""
+    return [datetime.strptime(day, '%Y-%m-%d') for day in history.split(',')]
+
+
+def array_history(history: str) -> Habit:
+    """ Builds the history as stored by the Habit class"""
+    return Habit("bench", history = history)
+
+
+def main() -> None:
+    """ Prints the bytes per check-off for the old list storage and the array storage"""
+    # warming up the strptime caches, so they are not counted
+    list_history(daily_history(1))
+    for n_days in [365, 3 * 365, 10 * 365]:
+        history = daily_history(n_days)
+        # warming up the parse_date cache with the dates, so its entries are not counted as history memory
+        array_history(history)
+        before = measure(lambda: list_history(history))
+        after = measure(lambda: array_history(history))
+        print(f"{n_days:>6} check-offs: list[datetime] {before / n_days:6.1f} B/check-off, "
+              f"array('i') {after / n_days:6.1f} B/check-off")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import time
+from src.HabitTrackerCLI import *
+from benchmarks.bench_query import build_database
+
+
+def render_menu(habit_manager: HabitManager) -> str:
+    """ Renders the table of the main menu from all habits, the way it was done before"""
+    habit_names = list_currently_tracked_habits(list(habit_manager.habits.values()))
+    habit_info_list = list_habit_info(habit_manager.data_as_dict(), habit_names)
+    habit_info_table = [[x] for x in habit_info_list]
+    return tabulate(habit_info_table, headers = ['currently tracked Habits'], tablefmt = 'mixed_grid')
+
+
+def main(n_habits: int = 5000, n_frames: int = 20) -> None:
+    """ Prints the time per frame of the main menu table, without changes and with a check off before each frame"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, 365)
+        habit_manager = HabitManager(db_name, write_behind = True, flush_count = n_habits * n_frames)
+        habit_manager.load_habits_from_db()
+        names = list(habit_manager.habits)
+        menu_cache = MainMenuCache()
+        for label, render in [('tabulate', render_menu), ('cache', menu_cache.render)]:
+            render(habit_manager)
+            start = time.perf_counter()
+            for _ in range(n_frames):
+                render(habit_manager)
+            t_same = (time.perf_counter() - start) / n_frames
+            start = time.perf_counter()
+            for x in range(n_frames):
+                habit_manager.check_off_habits([names[x]])
+                habit_manager.uncheck_habit(names[x])
+                render(habit_manager)
+            t_changed = (time.perf_counter() - start) / n_frames
+            print(f"{label:>8}: {t_same * 1000:8.2f} ms per frame, {t_changed * 1000:8.2f} ms per frame after a change")
+        # the changes are not saved
+        habit_manager.database.close()
+
+
+if __name__ == "__main__":
+    # the number of habits and frames can be given as arguments, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+from src.HabitManager import *
+
+
+class ProbingHabitManager(HabitManager):
+    # Habit manager asking the database on every existence check, the way it was done before
+
+    def is_habit_exist(self, name: str) -> bool:
+        return name in self.habits and self.database.is_habit_exists(name)
+
+
+class ConnectingHabitManager(HabitManager):
+    # Habit manager opening a new connection for every existence check, as the module function does
+
+    def is_habit_exist(self, name: str) -> bool:
+        return name in self.habits and is_habit_exists(self.database.db_name, name)
+
+
+def operations(habit_manager: HabitManager) -> dict:
+    """ Builds the manager operations to be timed, each called once per habit name
+
+    :param HabitManager habit_manager: habit manager with the habits loaded
+    :return: dictionary of operation labels and functions of a habit name
+    :rtype: dict
+    """
+    return {
+        'exists': habit_manager.is_habit_exist,
+        'describe': lambda name: habit_manager.edit_habit_description(name, 'bench'),
+        'check off': lambda name: habit_manager.check_off_habits([name]),
+        'uncheck': habit_manager.uncheck_habit,
+        'rename': lambda name: habit_manager.edit_habit_name(name, name + ' renamed')
+                               and habit_manager.edit_habit_name(name + ' renamed', name),
+    }
+
+
+def main(n_habits: int = 1000) -> None:
+    """ Prints the time per call of the manager operations, with and without asking the database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for manager_class in [ConnectingHabitManager, ProbingHabitManager, HabitManager]:
+            db_name = os.path.join(tmp, manager_class.__name__ + '.db')
+            habit_manager = manager_class(db_name, tuning = 'fast')
+            for x in range(n_habits):
+                habit_manager.add_habit(f"habit {x}")
+            names = list(habit_manager.habits)
+            results = []
+            for label, func in operations(habit_manager).items():
+                start = time.perf_counter()
+                for name in names:
+                    func(name)
+                results.append(f"{label} {(time.perf_counter() - start) / n_habits * 1e6:7.1f} us")
+            habit_manager.close()
+            print(f"{manager_class.__name__:>22}: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    main()
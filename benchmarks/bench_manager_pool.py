@@ -0,0 +1,50 @@
+import os
+import sys
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from src.HabitManagerPool import *
+from benchmarks.bench_history_load import build_database
+
+
+def run(max_managers: int, n_requests: int, tenants: list) -> None:
+    """ Serves requests for the tenants from a pool, a fifth of the requests going to a few cold tenants,
+    and prints the hit rate, the time and the peak memory of the process"""
+    pool = HabitManagerPool(max_managers = max_managers)
+    hot = tenants[:max(1, min(len(tenants), 20))]
+    random.seed(1)
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        db_name = random.choice(hot) if random.random() < 0.8 else random.choice(tenants)
+        with pool.lease(db_name) as habit_manager:
+            habit_manager.is_habit_exist('habit 0')
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    pool.close()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{len(tenants):5} tenants, pool of {max_managers:5}: hits {stats.hits / n_requests:6.1%}, "
+          f"{stats.loads:5} loads, {stats.evictions:5} evictions in {elapsed:6.2f} s, peak RSS {peak:7.1f} MB")
+
+
+def main(n_tenants: int = 800, n_habits: int = 50, n_days: int = 90, n_requests: int = 20000) -> None:
+    """ Prints the peak memory of a bounded and an unbounded pool as the number of tenants grows,
+    each run in a fresh process"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tenants = []
+        for x in range(n_tenants):
+            tenants.append(os.path.join(tmp, f"tenant{x}.db"))
+            build_database(tenants[-1], n_habits, n_days)
+        for count in [n_tenants // 4, n_tenants // 2, n_tenants]:
+            for max_managers in [50, n_tenants]:
+                subprocess.run([sys.executable, '-m', 'benchmarks.bench_manager_pool', '--run',
+                                str(max_managers), str(n_requests)] + tenants[:count], check = True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--run']:
+        run(int(sys.argv[2]), int(sys.argv[3]), sys.argv[4:])
+    else:
+        # the number of tenants, habits, days and requests can be given as arguments, for a quicker run
+        main(*[int(arg) for arg in sys.argv[1:5]])
@@ -0,0 +1,68 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+from src.HabitManager import *
+from src.Analytics import *
+from benchmarks.bench_history_load import daily_history
+
+
+def build_database(db_name: str, n_habits: int, n_days: int) -> None:
+    """ Builds a database of habits of every periodicity, each daily habit with a different number of check-offs
+
+    :param str db_name: Name of the database file
+    :param int n_habits: number of habits
+    :param int n_days: maximum number of daily check-offs of a habit
+    :return: the function returns nothing
+    """
+    initialize_database(db_name)
+    days = daily_history(n_days).split(',')
+    periods = list(HabitPeriods)
+    with sqlite3.connect(db_name) as con:
+        con.executemany("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) VALUES(?, ?, ?, ?)",
+                        ((f"habit {x}", "", periods[x % 4].value, days[0]) for x in range(n_habits)))
+        con.executemany("INSERT INTO HabitCheckoff VALUES(?, ?)",
+                        ((x + 1, day) for x in range(0, n_habits, 4) for day in days[x % n_days:]))
+    con.close()
+
+
+def scan_queries(habit_manager: HabitManager) -> None:
+    """ Lists the habits by streak for each periodicity and the unchecked habits with scans of all habits,
+    the way the CLI did before"""
+    habit_list = list(habit_manager.habits.values())
+    habit_sorted = sorted(habit_list, key = lambda x: analytics_cache.habit_metrics(x).current_streak, reverse = True)
+    for periodicity in HabitPeriods:
+        list_habit_with_periodicity(habit_sorted, periodicity)
+    list_currently_unchecked_habits(habit_list)
+
+
+def index_queries(habit_manager: HabitManager) -> None:
+    """ Lists the habits by streak for each periodicity and the unchecked habits from the indexes"""
+    for periodicity in HabitPeriods:
+        habit_manager.query(periodicity, order_by = 'streak')
+    habit_manager.query(checked = False)
+
+
+def main(n_habits: int = 10000, n_days: int = 365, n_rounds: int = 50) -> None:
+    """ Prints the time of a check off followed by the CLI queries, with scans and with the indexes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, n_days)
+        for label, queries in [('scan', scan_queries), ('index', index_queries)]:
+            habit_manager = HabitManager(db_name, tuning = 'fast', write_behind = True, flush_count = n_habits)
+            habit_manager.load_habits_from_db()
+            queries(habit_manager)
+            start = time.perf_counter()
+            for x in range(n_rounds):
+                habit_manager.check_off_habits([f"habit {x}"])
+                queries(habit_manager)
+            elapsed = (time.perf_counter() - start) / n_rounds
+            # the changes are not saved, so both runs start from the same database
+            habit_manager.database.close()
+            print(f"{label:>6}: {elapsed * 1000:8.2f} ms per check off and queries of {n_habits} habits")
+
+
+if __name__ == "__main__":
+    # the number of habits, days and rounds can be given as arguments, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+import time
+from src.HabitManager import *
+from benchmarks.bench_history_load import daily_history
+
+
+def rename_by_copy(habit_manager: HabitManager, old_name: str, new_name: str) -> None:
+    """ Renames the habit by building a new habit from the old one, then deleting the old habit
+    and adding the new one to the database, the way it was done before"""
+    old = habit_manager.habits[old_name]
+    new_habit_obj = Habit(new_name, old.description, old.periodicity, old.get_creation_date(), old.get_history())
+    habit_manager.habits[new_name] = new_habit_obj
+    del habit_manager.habits[old_name]
+    habit_manager.database.delete_habit(old_name)
+    habit_manager.database.add_habit(new_habit_obj)
+
+
+def main(n_renames: int = 200) -> None:
+    """ Prints the time per rename of a habit, for growing history lengths"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_days in [10, 100, 1000, 10000]:
+            results = []
+            for label, rename in [('copy', rename_by_copy), ('in place', HabitManager.edit_habit_name)]:
+                habit_manager = HabitManager(os.path.join(tmp, f"{n_days}_{label}.db"), tuning = 'fast')
+                habit_manager.add_habit('habit 0', history = daily_history(n_days))
+                start = time.perf_counter()
+                for x in range(n_renames):
+                    rename(habit_manager, f"habit {x}", f"habit {x + 1}")
+                results.append(f"{label} {(time.perf_counter() - start) / n_renames * 1e6:9.1f} us")
+                habit_manager.close()
+            print(f"{n_days:6} days: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    # the number of renames can be given as an argument, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:2]])
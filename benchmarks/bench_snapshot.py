@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+from src.HabitManager import *
+from benchmarks.bench_history_load import build_database
+
+
+class CopyingHabitManager(HabitManager):
+    # Habit manager copying the habits dict on every call, the way it was done before
+
+    def data_as_dict(self):
+        return self.habits.copy()
+
+
+def main(n_habits: int = 10000, n_calls: int = 1000) -> None:
+    """ Prints the time per data_as_dict call, with no changes between the calls and with a check off before each"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        build_database(db_name, n_habits, 30)
+        for manager_class in [CopyingHabitManager, HabitManager]:
+            habit_manager = manager_class(db_name, write_behind = True, flush_count = n_habits * n_calls)
+            habit_manager.load_habits_from_db()
+            names = list(habit_manager.habits)
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                habit_manager.data_as_dict()
+            t_reads = (time.perf_counter() - start) / n_calls
+            start = time.perf_counter()
+            for x in range(n_calls):
+                habit_manager.uncheck_habit(names[x % n_habits])
+                habit_manager.data_as_dict()
+            t_changes = (time.perf_counter() - start) / n_calls
+            # the changes are not saved, so both runs start from the same database
+            habit_manager.database.close()
+            print(f"{manager_class.__name__:>19}: {t_reads * 1e6:8.1f} us per call, "
+                  f"{t_changes * 1e6:8.1f} us per change and call")
+
+
+if __name__ == "__main__":
+    # the number of habits and calls can be given as arguments, for a quicker run
+    main(*[int(arg) for arg in sys.argv[1:3]])
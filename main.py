@@ -8,10 +8,11 @@ def main() -> None:
 
     logging.basicConfig(filemode = "habit_log.log", level=logging.ERROR)
 
-    habit_manager = HabitManager("Habit_data.db")
+    habit_manager = HabitManager("Habit_data.db", tuning = 'wal')
     habit_manager.load_habits_from_db()
     habit_cli = HabitTrackerCLI(habit_manager)
     habit_cli.main_loop()
+    habit_manager.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,97 @@
+import weakref
+import threading
 from src.Habit import *
-from math import ceil
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional, it is only needed for the batch analytics
+    np = None
+
+
+class AnalyticsCache:
+    # Cache of habit metrics, that can be shared by many threads.
+    # Only the latest metrics of each habit are kept, keyed by the id of the habit, with the version of the habit
+    # and the date they were calculated for, so changes and the next day miss the cache and replace the entry.
+    # The cache is bounded by the number of live habits, so a scan of all habits hits however many there are.
+    # The habits are not kept alive by the cache: when a habit is collected its id is queued by a finalizer,
+    # and its metrics are removed at the start of the next call, before the id can be looked up again.
+
+    def __init__(self) -> None:
+        """ Initializes the analytics cache
+
+        :return: The function returns nothing
+        """
+        self.hits = 0
+        self.misses = 0
+        # id of the habit -> (version, day ordinal, metrics)
+        self.__entries = {}
+        # id of the habit -> finalizer of the habit
+        self.__finalizers = {}
+        # ids of the collected habits, appended by the finalizers without taking the lock
+        self.__collected = []
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def habit_metrics(self, habit: Habit, today: int = None) -> HabitMetrics:
+        """ Returns the metrics of the habit, calculating them only if they are not cached
+
+        :param Habit habit: habit object
+        :param int today: the date to calculate against, as a day ordinal (Default is current date)
+        :return: metrics of the habit
+        :rtype: HabitMetrics
+        :raises HabitError: Raises exception when irregularity is detected.
+        """
+        if today is None:
+            today = datetime.now().toordinal()
+        ident = id(habit)
+        version = habit.version
+        with self.__lock:
+            self.__purge()
+            entry = self.__entries.get(ident)
+            if entry is not None and entry[0] == version and entry[1] == today:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # the metrics are calculated outside the lock, so other threads are not held up
+        metrics = habit.habit_metrics(today)
+        with self.__lock:
+            self.__purge()
+            self.__entries[ident] = (version, today, metrics)
+            if ident not in self.__finalizers:
+                self.__finalizers[ident] = weakref.finalize(habit, self.__collected.append, ident)
+        return metrics
+
+    def __purge(self) -> None:
+        """ Removes the metrics of the collected habits. The lock must be held.
+
+        :return: The function returns nothing
+        """
+        while self.__collected:
+            ident = self.__collected.pop()
+            self.__entries.pop(ident, None)
+            self.__finalizers.pop(ident, None)
+
+    def clear(self) -> None:
+        """ Removes all cached metrics, and resets the counters
+
+        :return: The function returns nothing
+        """
+        with self.__lock:
+            for finalizer in self.__finalizers.values():
+                finalizer.detach()
+            self.__finalizers.clear()
+            self.__collected.clear()
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# shared cache for the analytics functions and the command line interface
+analytics_cache = AnalyticsCache()
 
 
 def analytics_time_duration(recent_date: datetime, older_date: datetime, periodicity = HabitPeriods.DAILY) -> int:
@@ -11,25 +103,14 @@ def analytics_time_duration(recent_date: datetime, older_date: datetime, periodi
     :return: the distance between the dates
     :rtype: int
     """
-    if periodicity == HabitPeriods.DAILY:
-        return (recent_date - older_date).days
-    elif periodicity == HabitPeriods.WEEKLY:
-        days_inbetween = (recent_date - older_date).days
-        r = ((recent_date.weekday() + 1) % 7) + 1
-        o = ((older_date.weekday() + 1) % 7) + 1
-        return 0 if days_inbetween < 7 else ceil((days_inbetween - (r - 1) - (7 - o)) / 7)
-    elif periodicity == HabitPeriods.MONTHLY:
-        return (recent_date.year - older_date.year) * 12 + recent_date.month - older_date.month
-    elif periodicity == HabitPeriods.YEARLY:
-        return recent_date.year - older_date.year
-    return 0
+    return period_duration(recent_date.toordinal(), older_date.toordinal(), periodicity)
 
 
 def analyze_streak(h_dates, older, periodicity) -> tuple[int, int]:
-    """ Recursive function for calculating the streaks.
+    """ Calculates the streaks of the given dates followed by the older date, in a single pass.
 
     :param h_dates: list of dates to calculate from.
-    :param older: the older date from the previous iteration.
+    :param older: the date following the list of dates.
     :param periodicity: periodicity of the habit
     :return: returns current streak, and longest streak.
     :rtype: tuple[int, int]
@@ -37,21 +118,20 @@ def analyze_streak(h_dates, older, periodicity) -> tuple[int, int]:
     if not h_dates:
         return 0, 0
 
-    time_diff = analytics_time_duration(older, h_dates[-1], periodicity)
-
-    # checking the end of list
-    if (len(h_dates)) <= 1:
-        return (2, 2) if time_diff == 1 else (0, 1)
-
-    # calling the recursion
-    current, longest = analyze_streak(h_dates[0:-1], h_dates[-1], periodicity)
+    days = [day.toordinal() for day in h_dates]
+    days.append(older.toordinal())
+    durations = period_durations(days, periodicity)
 
-    if time_diff == 1:
-        return current + 1, max(current + 1, longest)
-    elif time_diff < 0:
-        return 0, 0
-    else:
-        return 1, longest
+    current, longest = (2, 2) if durations[0] == 1 else (0, 1)
+    for time_diff in durations[1:]:
+        if time_diff == 1:
+            current += 1
+            longest = max(current, longest)
+        elif time_diff < 0:
+            current, longest = 0, 0
+        else:
+            current = 1
+    return current, longest
 
 
 def analytics_habit_streak(h_dates: list, periodicity) -> tuple[int, int]:
@@ -78,10 +158,11 @@ def analytics_habit_streak(h_dates: list, periodicity) -> tuple[int, int]:
 
 
 def analyze_breaks(h_dates, older, periodicity) -> tuple:
-    """ Recursive function for calculates longest break, and total number of breaks.
+    """ Calculates longest break, and total number of breaks of the given dates followed by the older date,
+    in a single pass.
 
     :param h_dates: list of dates.
-    :param older: oldest date from the previous iteration.
+    :param older: the date following the list of dates.
     :param periodicity: periodicity of the habit
     :return: longest break, total number of breaks.
     :rtype: tuple[int, int]
@@ -89,20 +170,20 @@ def analyze_breaks(h_dates, older, periodicity) -> tuple:
     if not h_dates:
         return 0, 0
 
-    time_diff = analytics_time_duration(older, h_dates[-1], periodicity)
-
-    # checking the end of list
-    if (len(h_dates)) <= 1:
-        return (time_diff - 1, 1) if time_diff > 1 else (0, 0)
+    days = [day.toordinal() for day in h_dates]
+    days.append(older.toordinal())
+    durations = period_durations(days, periodicity)
 
-    # calling the recursion
-    longest, total = analyze_breaks(h_dates[0:-1], h_dates[-1], periodicity)
-    if time_diff == 1:
-        return longest, total
-    elif time_diff < 0:
-        return 0, 0
-    else:
-        return max(time_diff - 1, longest), total + 1
+    longest, total = (durations[0] - 1, 1) if durations[0] > 1 else (0, 0)
+    for time_diff in durations[1:]:
+        if time_diff == 1:
+            continue
+        elif time_diff < 0:
+            longest, total = 0, 0
+        else:
+            longest = max(time_diff - 1, longest)
+            total += 1
+    return longest, total
 
 
 def analytics_habit_breaks(h_dates: list, periodicity) -> tuple[int, int]:
@@ -127,19 +208,35 @@ def analytics_habit_breaks(h_dates: list, periodicity) -> tuple[int, int]:
     return longest_break, total_breaks
 
 
-# Functions are implemented with recursion.
+# Functions are implemented as generators, with list wrappers keeping the previous signatures.
+def iter_currently_tracked_habits(habit_data):
+    """Yields the names of currently tracked habits
+
+    :param habit_data: iterable of all habit objects
+    :return: generator of names as string
+    """
+    for habit in habit_data:
+        yield habit.name
+
+
 def list_currently_tracked_habits(habit_data: list) -> list:
     """Lists the names of currently tracked habits
 
     :param list habit_data: list of all habit objects
     :return: list of names as string
     """
-    if not habit_data:
-        return []
-    else:
-        habit = habit_data[0]
-        result = [habit.name]
-        return result + list_currently_tracked_habits(habit_data[1:])
+    return list(iter_currently_tracked_habits(habit_data))
+
+
+def iter_currently_unchecked_habits(habit_data):
+    """Yields the names of currently unchecked habits for today
+
+    :param habit_data: iterable of all habit objects
+    :return: generator of names as string
+    """
+    for habit in habit_data:
+        if habit.is_checked_off() is False:
+            yield habit.name
 
 
 def list_currently_unchecked_habits(habit_data: list) -> list:
@@ -148,12 +245,18 @@ def list_currently_unchecked_habits(habit_data: list) -> list:
     :param list habit_data: list of all habit objects
     :return: list of names as string
     """
-    if not habit_data:
-        return []
-    else:
-        habit = habit_data[0]
-        result = [habit.name] if habit.is_checked_off() is False else []
-        return result + list_currently_unchecked_habits(habit_data[1:])
+    return list(iter_currently_unchecked_habits(habit_data))
+
+
+def iter_currently_checked_habits(habit_data):
+    """ Yields the names of currently checked habits for today
+
+    :param habit_data: iterable of all habit objects
+    :return: generator of names as string
+    """
+    for habit in habit_data:
+        if habit.is_checked_off() is True:
+            yield habit.name
 
 
 def list_currently_checked_habits(habit_data: list) -> list:
@@ -162,12 +265,19 @@ def list_currently_checked_habits(habit_data: list) -> list:
     :param list habit_data: list of all habit objects
     :return: list of names as string
     """
-    if not habit_data:
-        return []
-    else:
-        habit = habit_data[0]
-        result = [habit.name] if habit.is_checked_off() is True else []
-        return result + list_currently_checked_habits(habit_data[1:])
+    return list(iter_currently_checked_habits(habit_data))
+
+
+def iter_habit_with_periodicity(habit_data, periodicity = HabitPeriods.DAILY):
+    """ Yields the names of habit with given periodicity
+
+    :param habit_data: iterable of all habit objects.
+    :param HabitPeriods periodicity: periodicity to be selected.
+    :return: generator of names as string
+    """
+    for habit in habit_data:
+        if habit.periodicity == periodicity:
+            yield habit.name
 
 
 def list_habit_with_periodicity(habit_data: list, periodicity = HabitPeriods.DAILY):
@@ -177,12 +287,7 @@ def list_habit_with_periodicity(habit_data: list, periodicity = HabitPeriods.DAI
     :param HabitPeriods periodicity: periodicity to be selected.
     :return: list of names as string
     """
-    if not habit_data:
-        return []
-    else:
-        habit = habit_data[0]
-        result = [habit.name] if habit.periodicity == periodicity else []
-        return result + list_habit_with_periodicity(habit_data[1:], periodicity)
+    return list(iter_habit_with_periodicity(habit_data, periodicity))
 
 
 def str_truncate(name: str) -> str:
@@ -219,7 +324,8 @@ def habit_info(habit: Habit) -> str:
     :return: string containing analytical information
     :rtype: str
     """
-    current_streak, longest_streak = habit.habit_streak()
+    metrics = analytics_cache.habit_metrics(habit)
+    current_streak, longest_streak = metrics.current_streak, metrics.longest_streak
     check_icon = "\N{White Heavy Check Mark}" if habit.is_checked_off() else "\N{White Square Button}"
     stats = ("" + check_icon + " " + str_truncate(habit.name) +
              "  \N{Fire} " + float_truncate(current_streak) +
@@ -228,6 +334,17 @@ def habit_info(habit: Habit) -> str:
     return stats
 
 
+def iter_habit_info(habit_data: dict, name_list):
+    """ Yields the analytics info of the given habit names
+
+    :param dict habit_data: dictionary of habit objects
+    :param name_list: iterable of names of habit
+    :return: generator of analytics information
+    """
+    for name in name_list:
+        yield habit_info(habit_data[name])
+
+
 def list_habit_info(habit_data: dict, name_list: list) -> list:
     """ Lists the analytics info of the given habit names
 
@@ -236,10 +353,7 @@ def list_habit_info(habit_data: dict, name_list: list) -> list:
     :return: list of analytics information
     :rtype: list
     """
-    if not name_list:
-        return []
-    else:
-        return [habit_info(habit_data[name_list[0]])] + list_habit_info(habit_data, name_list[1:])
+    return list(iter_habit_info(habit_data, name_list))
 
 
 def habit_analytics(habit: Habit) -> list:
@@ -251,19 +365,8 @@ def habit_analytics(habit: Habit) -> list:
     :return: list of analytical information
     :rtype: list
     """
-    habit_table = []
-    current_streak, longest_streak = habit.habit_streak()
-    longest_break, total_breaks = habit.habit_breaks()
-    total_checkoffs, total_duration = habit.habit_stats()
-
+    habit_table = habit_analytics_table(habit)
     habit_table.extend([
-        habit.name,
-        round(current_streak),
-        round(longest_streak),
-        round(longest_break),
-        round(total_breaks),
-        round(total_checkoffs),
-        round(total_duration),
         habit.periodicity.value,
         habit.get_creation_date(),
         habit.description
@@ -271,6 +374,17 @@ def habit_analytics(habit: Habit) -> list:
     return habit_table
 
 
+def iter_habit_analytics(habit_data: dict, name_list):
+    """ Yields the analytical information of given habit names.
+
+    :param dict habit_data: dictionary of habit objects
+    :param name_list: iterable of the names of the habits
+    :return: generator of habit names with analytics.
+    """
+    for name in name_list:
+        yield habit_analytics(habit_data[name])
+
+
 def list_habit_analytics(habit_data: dict, name_list: list):
     """ Generates a list containing list of analytical information of given habit names.
 
@@ -278,10 +392,7 @@ def list_habit_analytics(habit_data: dict, name_list: list):
     :param name_list: list containing the name of the habits
     :return: list of habit names with analytics.
     """
-    if not name_list:
-        return []
-    else:
-        return [habit_analytics(habit_data[name_list[0]])] + list_habit_analytics(habit_data, name_list[1:])
+    return list(iter_habit_analytics(habit_data, name_list))
 
 
 def habit_analytics_table(habit: Habit) -> list:
@@ -293,24 +404,22 @@ def habit_analytics_table(habit: Habit) -> list:
     :return: list of analytical information
     :rtype: list
     """
-    habit_info_table = []
-    current_streak, longest_streak = habit.habit_streak()
-    longest_break, total_breaks = habit.habit_breaks()
-    total_checkoffs, total_duration = habit.habit_stats()
-
-    habit_info_table.extend([
-        habit.name,
-        round(current_streak),
-        round(longest_streak),
-        round(longest_break),
-        round(total_breaks),
-        round(total_checkoffs),
-        round(total_duration),
-
-    ])
+    habit_info_table = [habit.name]
+    habit_info_table.extend(analytics_cache.habit_metrics(habit))
     return habit_info_table
 
 
+def iter_habit_analytics_table(habit_data: dict, name_list):
+    """ Yields the analytical information of given habit names, for the analytics table.
+
+    :param dict habit_data: dictionary of habit objects
+    :param name_list: iterable of the names of the habits
+    :return: generator of habit names with analytics.
+    """
+    for name in name_list:
+        yield habit_analytics_table(habit_data[name])
+
+
 def list_habit_analytics_table(habit_data: dict, name_list: list):
     """ Generates a list containing list of analytical information of given habit names.
 
@@ -318,7 +427,171 @@ def list_habit_analytics_table(habit_data: dict, name_list: list):
     :param name_list: list containing the name of the habits
     :return: list of habit names with analytics.
     """
-    if not name_list:
-        return []
-    else:
-        return [habit_analytics_table(habit_data[name_list[0]])] + list_habit_analytics_table(habit_data, name_list[1:])
+    return list(iter_habit_analytics_table(habit_data, name_list))
+
+
+def habit_analytics_tables(habit_data, today: int = None) -> dict:
+    """ Creates the analytics tables of all the given habits in a single pass, grouped by periodicity.
+    The metrics of each habit are calculated once, and each table is sorted by the current streak,
+    habits with the same streak keeping their order. The rows are the same as habit_analytics_table.
+
+    :param habit_data: iterable of all habit objects
+    :param int today: the date to calculate against, as a day ordinal (Default is current date)
+    :return: dictionary of periodicity to the list of analytical information of each habit
+    :rtype: dict
+    :raises HabitError: Raises exception when irregularity is detected in any of the habits.
+    """
+    if today is None:
+        today = datetime.now().toordinal()
+    tables = {periodicity: [] for periodicity in HabitPeriods}
+    for habit in habit_data:
+        tables[habit.periodicity].append([habit.name, *analytics_cache.habit_metrics(habit, today)])
+    for table in tables.values():
+        table.sort(key = lambda row: row[1], reverse = True)
+    return tables
+
+
+def batch_period_indexes(days, periodicity: HabitPeriods):
+    """ Maps an array of day ordinals to the indexes of their periods, same as period_index.
+
+    :param days: numpy array of day ordinals
+    :param HabitPeriods periodicity: periodicity of the habits
+    :return: numpy array of period indexes
+    """
+    if periodicity == HabitPeriods.DAILY:
+        return days
+    elif periodicity == HabitPeriods.WEEKLY:
+        return days // 7
+    # datetime64 counts the days from 1970-01-01, which is the day ordinal 719163
+    dates = (days - 719163).astype('datetime64[D]')
+    if periodicity == HabitPeriods.MONTHLY:
+        return dates.astype('datetime64[M]').astype(np.int64) + (1970 * 12 + 1)
+    return dates.astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def batch_period_durations(recent_days, older_days, periodicity: HabitPeriods):
+    """ Calculates the number of periods between two arrays of dates, same as period_duration.
+
+    :param recent_days: numpy array of the recent dates as day ordinals
+    :param older_days: numpy array of the older dates as day ordinals
+    :param HabitPeriods periodicity: periodicity of the habits
+    :return: numpy array of durations
+    """
+    durations = batch_period_indexes(recent_days, periodicity) - batch_period_indexes(older_days, periodicity)
+    if periodicity == HabitPeriods.WEEKLY:
+        durations[recent_days - older_days < 7] = 0
+    return durations
+
+
+def batch_habit_metrics(habits: list, periodicity: HabitPeriods, today: int):
+    """ Calculates the metrics of habits with the same periodicity at once, with numpy.
+    All histories are packed into one array, and the streaks and breaks are computed per segment.
+
+    :param list habits: list of habit objects with the given periodicity
+    :param HabitPeriods periodicity: periodicity of the habits
+    :param int today: the date to calculate against, as a day ordinal
+    :return: dictionary of the HabitMetrics fields to numpy arrays, in the order of the habits
+    :rtype: dict
+    :raises HabitError: Raises exception when irregularity is detected in any of the habits.
+    """
+    histories = [habit.habit_history for habit in habits]
+    lengths = np.array([len(history) for history in histories], dtype = np.int64)
+    columns = {field: np.zeros(len(habits), dtype = np.int64) for field in HabitMetrics._fields}
+    tracked = np.flatnonzero(lengths)
+    if len(tracked) == 0:
+        return columns
+
+    days = np.concatenate([np.frombuffer(histories[i], dtype = np.intc) for i in tracked]).astype(np.int64)
+    counts = lengths[tracked]
+    ends = np.cumsum(counts) - 1
+    starts = ends - counts + 1
+    is_start = np.zeros(len(days), dtype = bool)
+    is_start[starts] = True
+
+    # duration to the previous entry of the same habit
+    durations = np.zeros(len(days), dtype = np.int64)
+    durations[1:] = batch_period_durations(days[1:], days[:-1], periodicity)
+    is_break = (durations > 1) & ~is_start
+    irregular = np.logical_or.reduceat((durations < 0) & ~is_start, starts)
+
+    # length of the run of consecutive periods ending at each entry
+    positions = np.arange(len(days))
+    run_starts = np.maximum.accumulate(np.where(is_start | (durations != 1), positions, 0))
+    runs = positions - run_starts + 1
+
+    current_streak = runs[ends]
+    longest_streak = np.maximum.reduceat(runs, starts)
+    longest_break = np.maximum.reduceat(np.where(is_break, durations - 1, 1), starts)
+    total_breaks = np.add.reduceat(is_break.astype(np.int64), starts)
+
+    # difference between today and the last entry
+    today_days = np.full(len(tracked), today, dtype = np.int64)
+    diff = batch_period_durations(today_days, days[ends], periodicity)
+    creation = np.array([habits[i].creation_date.toordinal() for i in tracked], dtype = np.int64)
+    total_duration = batch_period_durations(today_days, creation, periodicity)
+
+    invalid = irregular | (diff < 0) | (total_duration < 0)
+    if invalid.any():
+        name = habits[tracked[np.argmax(invalid)]].name
+        logging.error("Irregular dates")
+        raise HabitError("Error: Irregular dates in " + name + "\n Try resetting the history.")
+
+    missed = diff > 1
+    columns['current_streak'][tracked] = np.where(missed, 0, current_streak)
+    columns['longest_streak'][tracked] = longest_streak
+    columns['longest_break'][tracked] = np.where(missed, np.maximum(diff - 1, longest_break), longest_break)
+    columns['total_breaks'][tracked] = total_breaks + missed
+    columns['total_checkoffs'][tracked] = counts
+    columns['total_duration'][tracked] = total_duration + 1
+    return columns
+
+
+def batch_habit_analytics(habit_data, today: int = None) -> dict:
+    """ Calculates the analytics of all the given habits at once, grouped by periodicity.
+    Requires numpy, see is_batch_analytics_available.
+
+    :param habit_data: iterable of all habit objects
+    :param int today: the date to calculate against, as a day ordinal (Default is current date)
+    :return: dictionary of periodicity to columns, with the names under 'name' and
+        a numpy array for each of the HabitMetrics fields.
+    :rtype: dict
+    :raises HabitError: Raises exception when irregularity is detected in any of the habits.
+    """
+    if np is None:
+        raise ImportError("batch analytics requires numpy")
+    if today is None:
+        today = datetime.now().toordinal()
+
+    groups = {periodicity: [] for periodicity in HabitPeriods}
+    for habit in habit_data:
+        groups[habit.periodicity].append(habit)
+
+    result = {}
+    for periodicity, habits in groups.items():
+        columns = batch_habit_metrics(habits, periodicity, today)
+        columns['name'] = [habit.name for habit in habits]
+        result[periodicity] = columns
+    return result
+
+
+def batch_analytics_table(columns: dict) -> list:
+    """ Creates the analytics table from the columns of one periodicity from batch_habit_analytics,
+    sorted by the current streak, with the same rows as habit_analytics_table.
+
+    :param dict columns: columns of a periodicity
+    :return: list of analytical information of each habit
+    :rtype: list
+    """
+    order = np.argsort(-columns['current_streak'], kind = 'stable')
+    metrics = [columns[field][order].tolist() for field in HabitMetrics._fields]
+    names = [columns['name'][i] for i in order]
+    return [list(row) for row in zip(names, *metrics)]
+
+
+def is_batch_analytics_available() -> bool:
+    """ Checks if numpy is installed for the batch analytics
+
+    :return: True if batch analytics can be used, False otherwise
+    :rtype: bool
+    """
+    return np is not None
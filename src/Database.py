@@ -1,156 +1,855 @@
 import sqlite3
+import queue
+import weakref
+import threading
 import contextlib as clib
+from concurrent.futures import Future
 from src.Habit import *
 
+# version of the database schema, stored as the user_version of the database file
+# 0: history stored as one comma joined string per habit in HabitHistory
+# 1: history stored as one row per check off in HabitCheckoff
+# 2: habits identified by a habit_id surrogate key, so a rename doesn't touch the check offs
+SCHEMA_VERSION = 2
+
+
+class DatabaseTuning(NamedTuple):
+    # SQLite settings applied when a connection is opened, None keeps the SQLite default
+
+    journal_mode: str | None = None
+    synchronous: str | None = None
+    cache_size: int | None = None
+    mmap_size: int | None = None
+    temp_store: str | None = None
+    busy_timeout: int | None = None
+
+    def pragmas(self) -> list:
+        """ Builds the pragma statements of the tuning profile
+
+        :return: list of pragma statements
+        :rtype: list
+        """
+        statements = []
+        for setting, allowed in (('journal_mode', ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')),
+                                 ('synchronous', ('OFF', 'NORMAL', 'FULL', 'EXTRA')),
+                                 ('temp_store', ('DEFAULT', 'FILE', 'MEMORY'))):
+            value = getattr(self, setting)
+            if value is None:
+                continue
+            if value.upper() not in allowed:
+                raise ValueError(f"Invalid {setting}: {value}")
+            statements.append(f"PRAGMA {setting} = {value.upper()}")
+        for setting in ('cache_size', 'mmap_size', 'busy_timeout'):
+            value = getattr(self, setting)
+            if value is not None:
+                statements.append(f"PRAGMA {setting} = {int(value)}")
+        return statements
+
+
+# tuning profiles by name
+# default: the SQLite defaults, with the rollback journal
+# wal: write ahead log, readers don't block the writer, and each commit is synced
+# fast: write ahead log synced only at checkpoints, with a larger page cache and memory mapped reads
+TUNING_PROFILES = {
+    'default': DatabaseTuning(),
+    'wal': DatabaseTuning(journal_mode = 'WAL', synchronous = 'FULL', busy_timeout = 5000),
+    'fast': DatabaseTuning(journal_mode = 'WAL', synchronous = 'NORMAL', cache_size = -65536,
+                           mmap_size = 268435456, temp_store = 'MEMORY', busy_timeout = 5000),
+}
+
+
+def ordinal_sql(day: str) -> str:
+    """ Builds the SQL expression of a date as a day ordinal, same as date.toordinal
+
+    :param str day: SQL expression of a date in "%Y-%m-%d" format
+    :return: SQL expression of the day ordinal
+    :rtype: str
+    """
+    return f"CAST(julianday({day}) - 1721424.5 AS INTEGER)"
 
-def initialize_database(db_name: str):
-    """ Initializes the database by creating if tables doesn't exist
 
-    :param str db_name: Name of the database
-    :return: Returns True if successfully initialized.
+def period_sql(day: str) -> str:
+    """ Builds the SQL expression of the period index of a date, same as period_index.
+    The periodicity is taken from the periodicity column of HabitData.
+
+    :param str day: SQL expression of a date in "%Y-%m-%d" format
+    :return: SQL expression of the period index
+    :rtype: str
     """
+    return (f"CASE periodicity WHEN 'daily' THEN {ordinal_sql(day)} "
+            f"WHEN 'weekly' THEN {ordinal_sql(day)} / 7 "
+            f"WHEN 'monthly' THEN CAST(substr({day}, 1, 4) AS INTEGER) * 12 + CAST(substr({day}, 6, 2) AS INTEGER) "
+            f"WHEN 'yearly' THEN CAST(substr({day}, 1, 4) AS INTEGER) END")
 
-    query1 = """CREATE TABLE IF NOT EXISTS HabitData (
-    habit_name TEXT PRIMARY KEY ,
-    descr TEXT,
-    periodicity TEXT,
-    creation_date TEXT
-    )"""
 
-    query2 = """CREATE TABLE IF NOT EXISTS HabitHistory (
-    habit_name TEXT,
-    history TEXT
-    )"""
+def duration_sql(recent_day: str, older_day: str) -> str:
+    """ Builds the SQL expression of the number of periods between two dates, same as period_duration
 
-    with clib.closing(sqlite3.connect(db_name)) as con:
+    :param str recent_day: SQL expression of the recent date in "%Y-%m-%d" format
+    :param str older_day: SQL expression of the older date in "%Y-%m-%d" format
+    :return: SQL expression of the number of periods
+    :rtype: str
+    """
+    return (f"CASE WHEN periodicity = 'weekly' AND {ordinal_sql(recent_day)} - {ordinal_sql(older_day)} < 7 THEN 0 "
+            f"ELSE ({period_sql(recent_day)}) - ({period_sql(older_day)}) END")
+
+
+# History of the habit d as a single "%Y-%m-%d,%Y-%m-%d" string, joined by SQLite as the dates are read in order
+# from the primary key, so only one row per habit is read back.
+HISTORY_SQL = ("(SELECT group_concat(period_date) FROM "
+               "(SELECT period_date FROM HabitCheckoff c WHERE c.habit_id = d.habit_id ORDER BY period_date))")
+
+# id of the habit named by the parameter, for the statements given a habit name
+HABIT_ID_SQL = "(SELECT habit_id FROM HabitData WHERE habit_name == ?)"
+
+# a single check off, given the habit name and the date
+ADD_CHECKOFF_SQL = f"INSERT OR IGNORE INTO HabitCheckoff SELECT {HABIT_ID_SQL}, ?"
+REMOVE_CHECKOFF_SQL = f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL} AND period_date == ?"
+
+
+# Streaks and breaks of every habit, with the same rules as Habit.habit_metrics.
+# Each check off gets the number of periods since the one before it (step), and a new island of
+# consecutive periods starts at every step other than 1. The running maximum of the island starts gives
+# the length of the island so far at each check off, so only one summary row per habit is read back.
+# The step from the last check off to :today decides the current streak, as in the habit class.
+METRICS_QUERY = f"""
+WITH checkoffs AS (
+    SELECT c.habit_id, c.period_date, d.periodicity,
+        {ordinal_sql('c.period_date')} AS day, {period_sql('c.period_date')} AS period
+    FROM HabitCheckoff c JOIN HabitData d ON d.habit_id = c.habit_id
+),
+steps AS (
+    SELECT habit_id, period_date, ROW_NUMBER() OVER w AS position,
+        CASE WHEN periodicity = 'weekly' AND day - LAG(day) OVER w < 7 THEN 0
+        ELSE period - LAG(period) OVER w END AS step
+    FROM checkoffs
+    WINDOW w AS (PARTITION BY habit_id ORDER BY period_date)
+),
+islands AS (
+    SELECT habit_id, period_date, position, step,
+        MAX(CASE WHEN step IS 1 THEN 0 ELSE position END)
+        OVER (PARTITION BY habit_id ORDER BY position ROWS UNBOUNDED PRECEDING) AS island_start
+    FROM steps
+),
+history AS (
+    SELECT habit_id, COUNT(*) AS checkoffs, MAX(period_date) AS last_date,
+        COUNT(CASE WHEN step > 1 THEN 1 END) AS breaks,
+        MAX(CASE WHEN step > 1 THEN step - 1 ELSE 1 END) AS longest_gap,
+        MAX(position - island_start + 1) AS longest_run,
+        COUNT(*) - MAX(island_start) + 1 AS last_run
+    FROM islands GROUP BY habit_id
+),
+summary AS (
+    SELECT d.habit_name, h.checkoffs, h.breaks, h.longest_gap, h.longest_run, h.last_run,
+        {duration_sql(':today', 'h.last_date')} AS today_step,
+        {duration_sql(':today', 'd.creation_date')} AS total_duration
+    FROM HabitData d LEFT JOIN history h ON h.habit_id = d.habit_id
+)
+SELECT habit_name,
+    CASE WHEN checkoffs IS NULL OR today_step > 1 THEN 0 ELSE last_run END AS current_streak,
+    COALESCE(longest_run, 0) AS longest_streak,
+    CASE WHEN checkoffs IS NULL THEN 0 WHEN today_step > 1 THEN max(longest_gap, today_step - 1)
+    ELSE longest_gap END AS longest_break,
+    CASE WHEN checkoffs IS NULL THEN 0 ELSE breaks + (today_step > 1) END AS total_breaks,
+    COALESCE(checkoffs, 0) AS total_checkoffs,
+    CASE WHEN checkoffs IS NULL THEN 0 ELSE total_duration + 1 END AS total_duration,
+    checkoffs IS NOT NULL AND (today_step < 0 OR total_duration < 0) AS irregular
+FROM summary
+ORDER BY habit_name
+"""
+
+
+class HabitDatabase:
+    # Owns a long lived connection to the database file.
+    # The queries are kept as constant strings, so sqlite3 prepares each of them once per connection
+    # and reuses the prepared statement from its statement cache.
+
+    def __init__(self, db_name: str, tuning: DatabaseTuning | str | None = None,
+                 check_same_thread: bool = True) -> None:
+        """ Opens the connection to the database
+
+        :param str db_name: Name of the database file
+        :param tuning: DatabaseTuning or the name of a profile in TUNING_PROFILES, applied on the connection
+        :param bool check_same_thread: allows the connection to be used only by the thread that opened it
+        :return: The function returns nothing
+        """
+        if isinstance(tuning, str):
+            tuning = TUNING_PROFILES[tuning]
+        self.db_name = db_name
+        self.tuning = tuning
+        self.connection = sqlite3.connect(db_name, check_same_thread = check_same_thread)
+        self.connection.row_factory = sqlite3.Row
+        if tuning is not None:
+            for statement in tuning.pragmas():
+                self.connection.execute(statement)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Closes the connection to the database
+
+        :return: The function returns nothing
+        """
+        self.connection.close()
+        return
+
+    def initialize(self) -> bool:
+        """ Initializes the database by creating if tables doesn't exist,
+        and migrates the database from an older schema version.
+
+        :return: Returns True if successfully initialized.
+        """
+
+        # the habit_id stays the same when the habit is renamed
+        query1 = """CREATE TABLE IF NOT EXISTS HabitData (
+        habit_id INTEGER PRIMARY KEY,
+        habit_name TEXT NOT NULL UNIQUE,
+        descr TEXT,
+        periodicity TEXT,
+        creation_date TEXT
+        )"""
+
+        # the primary key is the covering index for loading and checking off the history of a habit
+        query2 = """CREATE TABLE IF NOT EXISTS HabitCheckoff (
+        habit_id INTEGER NOT NULL,
+        period_date TEXT NOT NULL,
+        PRIMARY KEY (habit_id, period_date)
+        ) WITHOUT ROWID"""
+
+        con = self.connection
+        if con.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return True
         with con:
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute(query1)
-                cursor.execute(query2)
-                con.commit()
-    return True
+            con.execute("BEGIN")
+            old_tables = self.__rename_name_keyed_tables()
+            con.execute(query1)
+            con.execute(query2)
+            self.__migrate_name_keyed_tables(old_tables)
+            self.__migrate_history_table()
+            con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return True
+
+    def __rename_name_keyed_tables(self) -> list:
+        """ Renames the tables keyed by habit name, from before the habit_id, out of the way of the new tables
+
+        :return: names of the renamed tables
+        :rtype: list
+        """
+        con = self.connection
+        old_tables = []
+        for table in ('HabitData', 'HabitCheckoff'):
+            columns = [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+            if columns and 'habit_id' not in columns:
+                con.execute(f"ALTER TABLE {table} RENAME TO {table}ByName")
+                old_tables.append(table)
+        return old_tables
+
+    def __migrate_name_keyed_tables(self, old_tables: list) -> None:
+        """ Copies the rows of the tables keyed by habit name into the new tables, giving every habit its habit_id.
+        The old tables are dropped afterwards.
+
+        :param list old_tables: names of the renamed tables
+        :return: The function returns nothing
+        """
+        con = self.connection
+        if 'HabitData' in old_tables:
+            con.execute("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) "
+                        "SELECT habit_name, descr, periodicity, creation_date FROM HabitDataByName")
+            con.execute("DROP TABLE HabitDataByName")
+        if 'HabitCheckoff' in old_tables:
+            con.execute("INSERT OR IGNORE INTO HabitCheckoff SELECT d.habit_id, c.period_date "
+                        "FROM HabitCheckoffByName c JOIN HabitData d ON d.habit_name = c.habit_name")
+            con.execute("DROP TABLE HabitCheckoffByName")
+        return
+
+    def __migrate_history_table(self) -> None:
+        """ Moves the comma joined histories of the HabitHistory table into HabitCheckoff, one row per date.
+        The old table is dropped afterwards.
+
+        :return: The function returns nothing
+        """
+        con = self.connection
+        table = con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'HabitHistory'")
+        if table.fetchone() is None:
+            return
+        for name, history in con.execute("SELECT habit_name, history FROM HabitHistory").fetchall():
+            if not history:
+                continue
+            con.executemany(f"INSERT OR IGNORE INTO HabitCheckoff SELECT {HABIT_ID_SQL}, ?",
+                            ((name, day.strip()) for day in history.split(',') if day.strip()))
+        con.execute("DROP TABLE HabitHistory")
+        return
+
+    def add_habit(self, habit: Habit) -> bool:
+        """ Adds habit to the database
+
+        :param Habit habit: Habit object to be added to the database
+        :return: True if successfully added, False otherwise
+        :rtype: bool
+        """
+        with self.connection as con:
+            cursor = con.execute("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) "
+                                 "VALUES(?, ?, ?, ?)",
+                                 (habit.name, habit.description, habit.periodicity.value, habit.get_creation_date()))
+            self.__insert_history(habit, cursor.lastrowid)
+        return True
+
+    def __insert_history(self, habit: Habit, habit_id: int = None) -> None:
+        """ Inserts the history of the given habit, one row per date
+
+        :param Habit habit: Habit object with the history to insert
+        :param int habit_id: id of the habit, looked up by the habit name if not given
+        :return: The function returns nothing
+        """
+        history = habit.get_history()
+        if history:
+            if habit_id is None:
+                habit_id = self.connection.execute(f"SELECT {HABIT_ID_SQL}", (habit.name,)).fetchone()[0]
+            self.connection.executemany("INSERT OR IGNORE INTO HabitCheckoff VALUES(?, ?)",
+                                        ((habit_id, day) for day in history.split(',')))
+        return
+
+    def is_habit_exists(self, name: str) -> bool:
+        """ Checks if the given habit name is present in the database
+
+        :param str name: Name of the Habit to check
+        :return: True if the habit present in the database, False otherwise
+        :rtype: bool
+        """
+        cursor = self.connection.execute("SELECT 1 FROM HabitData WHERE habit_name == ?", (name,))
+        return cursor.fetchone() is not None
+
+    def delete_habit(self, name: str) -> None:
+        """ Delete the given habit from the database
+
+        :param str name: Name of the habit to delete
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute(f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL}", (name,))
+            con.execute("DELETE FROM HabitData WHERE habit_name == ?", (name,))
+        return
+
+    def rename_habit(self, old_name: str, new_name: str) -> None:
+        """ Renames the habit with a single update, the history stays with the habit_id
+
+        :param str old_name: Name of the habit to rename
+        :param str new_name: New name of the habit
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute("UPDATE HabitData SET habit_name = ? WHERE habit_name == ?", (new_name, old_name))
+        return
+
+    def load_habit_data(self) -> list:
+        """ Loads the data from the database
+
+        :return: list of sql row objects
+        :rtype: list
+        """
+        return self.connection.execute("SELECT habit_name, descr, periodicity, creation_date FROM HabitData").fetchall()
+
+    def load_habit_names(self) -> set:
+        """ Loads the names of all habits from the database, with a single query
+
+        :return: set of habit names
+        :rtype: set
+        """
+        return {row[0] for row in self.connection.execute("SELECT habit_name FROM HabitData")}
+
+    def iter_habit_history(self):
+        """ Streams the habit history from the database, in the order the habits were added
+
+        :return: generator of habit name and history string in "%Y-%m-%d,%Y-%m-%d" format, for every habit
+        """
+        cursor = self.connection.execute(f"SELECT d.habit_name, {HISTORY_SQL} FROM HabitData d ORDER BY d.habit_id")
+        for name, history in cursor:
+            yield name, history or ""
+
+    def iter_habits(self, chunk_size: int = 1000):
+        """ Streams the habits from the database with a single query, building each Habit object as its row arrives.
+        The rows are fetched in chunks, so only one chunk of rows is held at a time.
+        The history strings are kept as they are, and decoded when they are first needed.
+
+        :param int chunk_size: number of rows fetched at a time
+        :return: generator of Habit objects, in the order the habits were added
+        """
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"SELECT d.habit_name, d.descr, d.periodicity, d.creation_date, {HISTORY_SQL} "
+                       f"FROM HabitData d ORDER BY d.habit_id")
+        for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+            for name, desc, periodicity, creation_date, history in rows:
+                habit = Habit(name, desc, HabitPeriods(periodicity), creation_date)
+                if history:
+                    habit.set_history(history, lazy = True)
+                yield habit
+
+    def load_habit_history(self) -> list:
+        """ Loads habit history from the database
+
+        :return: a list of habit name and history string pairs
+        :rtype: list
+        """
+        return list(self.iter_habit_history())
+
+    def iter_habit_metrics(self, today: int = None):
+        """ Calculates the streaks, breaks and stats of every habit in the database, without loading the histories.
+        Only one summary row per habit is read back from the database.
+
+        :param int today: the date to calculate against, as a day ordinal (Default is current date)
+        :return: generator of habit name and HabitMetrics, ordered by habit name
+        :raises HabitError: Raises exception when irregularity is detected.
+        """
+        if today is None:
+            today = datetime.now().toordinal()
+        cursor = self.connection.execute(METRICS_QUERY, {'today': date.fromordinal(today).isoformat()})
+        for row in cursor:
+            if row[7]:
+                logging.error("Irregular dates")
+                raise HabitError("Error: Irregular dates in " + row[0] + "\n Try resetting the history.")
+            yield row[0], HabitMetrics(*row[1:7])
+
+    def update_habit_data(self, habit: Habit, with_history: bool = False) -> None:
+        """ Updates the habit data from the given object
+
+        :param Habit habit: Habit object to be updated
+        :param bool with_history: also replaces the history with the history of the object, in the same transaction
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute("UPDATE HabitData SET descr = ?, periodicity = ?, creation_date = ? WHERE habit_name == ?",
+                        (habit.description, habit.periodicity.value, habit.get_creation_date(), habit.name))
+            if with_history:
+                con.execute(f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL}", (habit.name,))
+                self.__insert_history(habit)
+        return
+
+    def update_habit_history(self, habit: Habit) -> None:
+        """ Replaces the whole habit history data with the history of the given Habit object
+
+        :param Habit habit: Habit object to be updated
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute(f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL}", (habit.name,))
+            self.__insert_history(habit)
+        return
+
+    def save_habits(self, habits: list, deleted_names = (), renames = (), histories = None,
+                    checkoffs = (), removed_checkoffs = ()) -> None:
+        """ Saves the data and history of the given habits, deletes the given habit names
+        and renames the given habits, in a single transaction.
+        If anything fails, the transaction is rolled back and the database is left as it was.
+        The renamed habits are first moved to temporary names, so the deleted names and the names swapped
+        between habits are free when they are given to the renamed habits.
+        The single check offs are applied last, with the statements of add_checkoffs and remove_checkoff.
+
+        :param list habits: list of Habit objects to be saved, added if they don't exist
+        :param deleted_names: names of the habits to be deleted
+        :param renames: pairs of the name in the database and the new name of the renamed habits
+        :param histories: Habit objects whose whole history is replaced, all the given habits if None
+        :param checkoffs: habit name and date pairs to be added to the histories, dates in "%Y-%m-%d" format
+        :param removed_checkoffs: habit name and date pairs to be removed from the histories
+        :return: The function returns nothing
+        """
+        if histories is None:
+            histories = habits
+        names = [(habit.name,) for habit in histories]
+        deleted = [(name,) for name in deleted_names]
+        renames = list(renames)
+        with self.connection as con:
+            con.executemany("UPDATE HabitData SET habit_name = char(0) || habit_name WHERE habit_name == ?",
+                            [(old_name,) for old_name, _ in renames])
+            con.executemany(f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL}", deleted)
+            con.executemany("DELETE FROM HabitData WHERE habit_name == ?", deleted)
+            con.executemany("UPDATE HabitData SET habit_name = ? WHERE habit_name == char(0) || ?",
+                            [(new_name, old_name) for old_name, new_name in renames])
+            con.executemany("INSERT INTO HabitData (habit_name, descr, periodicity, creation_date) VALUES(?, ?, ?, ?) "
+                            "ON CONFLICT (habit_name) DO UPDATE SET descr = excluded.descr, "
+                            "periodicity = excluded.periodicity, creation_date = excluded.creation_date",
+                            [(habit.name, habit.description, habit.periodicity.value, habit.get_creation_date())
+                             for habit in habits])
+            con.executemany(f"DELETE FROM HabitCheckoff WHERE habit_id == {HABIT_ID_SQL}", names)
+            for habit in histories:
+                self.__insert_history(habit)
+            con.executemany(ADD_CHECKOFF_SQL, checkoffs)
+            con.executemany(REMOVE_CHECKOFF_SQL, removed_checkoffs)
+        return
+
+    def add_checkoff(self, name: str, day: str) -> None:
+        """ Adds a single check off to the habit history
+
+        :param str name: Name of the habit
+        :param str day: date of the check off in "%Y-%m-%d" format
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute(ADD_CHECKOFF_SQL, (name, day))
+        return
+
+    def add_checkoffs(self, checkoffs: list) -> None:
+        """ Adds many check offs to the habit history, in a single transaction
+
+        :param list checkoffs: list of habit name and date pairs, dates in "%Y-%m-%d" format
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.executemany(ADD_CHECKOFF_SQL, checkoffs)
+        return
+
+    def remove_checkoff(self, name: str, day: str) -> None:
+        """ Removes a single check off from the habit history
+
+        :param str name: Name of the habit
+        :param str day: date of the check off in "%Y-%m-%d" format
+        :return: The function returns nothing
+        """
+        with self.connection as con:
+            con.execute(REMOVE_CHECKOFF_SQL, (name, day))
+        return
+
+
+class ReaderHolder:
+    # Holds the reading connection of a thread in its thread local data.
+    # The holder goes away with the thread local data when the thread exits, and its finalizer closes the connection.
+
+    __slots__ = ('database', '__weakref__')
+
+    def __init__(self, database: HabitDatabase) -> None:
+        self.database = database
+
+
+class ThreadedHabitDatabase:
+    # HabitDatabase shared by many threads.
+    # Writes are queued to a single writer thread, which owns the only connection that writes,
+    # so they are applied one at a time in the order they were queued.
+    # Reads run on a connection of the calling thread, opened on its first read and closed when the thread exits,
+    # so threads coming and going don't leave their connections open.
+    # The database is opened in WAL mode by default, so the readers and the writer don't wait for each other.
+
+    WRITE_METHODS = ('initialize', 'add_habit', 'delete_habit', 'rename_habit', 'update_habit_data',
+                     'update_habit_history', 'save_habits', 'add_checkoff', 'add_checkoffs', 'remove_checkoff')
+
+    def __init__(self, db_name: str, tuning: DatabaseTuning | str | None = 'wal') -> None:
+        """ Starts the writer thread of the database
+
+        :param str db_name: Name of the database file
+        :param tuning: DatabaseTuning or the name of a profile in TUNING_PROFILES, applied on every connection
+        :return: The function returns nothing
+        """
+        self.db_name = db_name
+        self.tuning = tuning
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+        writer = HabitDatabase(db_name, tuning, check_same_thread = False)
+        self._writer = threading.Thread(target = self.__write_loop, args = (writer,),
+                                        name = 'habit-database-writer', daemon = True)
+        self._writer.start()
+        return
+
+    def __write_loop(self, writer: HabitDatabase) -> None:
+        """ Applies the queued writes one at a time, until the database is closed
+
+        :param HabitDatabase writer: the connection used for writing
+        :return: The function returns nothing
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, method, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(getattr(writer, method)(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        writer.close()
+        return
+
+    def submit(self, method: str, *args) -> Future:
+        """ Queues a write to the writer thread, without waiting for it
+
+        :param str method: name of the HabitDatabase method, one of WRITE_METHODS
+        :param args: arguments of the method
+        :return: future of the result of the method
+        :rtype: Future
+        """
+        if method not in self.WRITE_METHODS:
+            raise ValueError(f"Not a write method: {method}")
+        if not self._writer.is_alive():
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        future = Future()
+        self._queue.put((future, method, args))
+        return future
+
+    def reader(self) -> HabitDatabase:
+        """ Gives the reading connection of the calling thread
+
+        :return: the database of the calling thread
+        :rtype: HabitDatabase
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            if not self._writer.is_alive():
+                raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+            holder = ReaderHolder(HabitDatabase(self.db_name, self.tuning, check_same_thread = False))
+            with self._readers_lock:
+                self._readers.add(holder.database)
+            weakref.finalize(holder, ThreadedHabitDatabase.__close_reader,
+                             self._readers, self._readers_lock, holder.database)
+            self._local.holder = holder
+        return holder.database
+
+    @staticmethod
+    def __close_reader(readers: set, readers_lock: threading.Lock, database: HabitDatabase) -> None:
+        """ Closes the reading connection of a thread that exited.
+        Given the set of readers instead of the database object, so the finalizer doesn't keep it alive.
+
+        :param set readers: the open reading connections
+        :param readers_lock: the lock of the readers
+        :param HabitDatabase database: the reading connection of the thread
+        :return: The function returns nothing
+        """
+        with readers_lock:
+            readers.discard(database)
+        database.close()
+        return
+
+    def __getattr__(self, name: str):
+        """ Writes are queued to the writer thread and waited for, everything else is read on the calling thread"""
+        if name in ThreadedHabitDatabase.WRITE_METHODS:
+            return lambda *args: self.submit(name, *args).result()
+        return getattr(self.reader(), name)
+
+    def close(self) -> None:
+        """ Applies the queued writes, then closes the writer and all reading connections
+
+        :return: The function returns nothing
+        """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self._readers_lock:
+            for database in self._readers:
+                database.close()
+            self._readers.clear()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+@clib.contextmanager
+def open_database(db_name):
+    """ Gives a database object for the module functions.
+    An open HabitDatabase is used as it is, a file name is opened and closed around the call.
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :return: context manager of the HabitDatabase
+    """
+    if isinstance(db_name, (HabitDatabase, ThreadedHabitDatabase)):
+        yield db_name
+        return
+    with HabitDatabase(db_name) as database:
+        yield database
 
 
-def add_habit_to_db(db_name: str, habit: Habit):
+def initialize_database(db_name):
+    """ Initializes the database by creating if tables doesn't exist
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :return: Returns True if successfully initialized.
+    """
+    with open_database(db_name) as database:
+        return database.initialize()
+
+
+def add_habit_to_db(db_name, habit: Habit):
     """ Adds habit to the database
 
-    :param str db_name: Name of the database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :param Habit habit: Habit object to be added to the database
     :return: True if successfully added, False otherwise
     :rtype: bool
     """
-
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("INSERT INTO HabitData VALUES(?, ?, ?, ?)",
-                               (habit.name, habit.description, habit.periodicity.value, habit.get_creation_date()))
-                cursor.execute("INSERT INTO HabitHistory VALUES(?,?)",
-                               (habit.name, habit.get_history()))
-                con.commit()
-    return True
+    with open_database(db_name) as database:
+        return database.add_habit(habit)
 
 
 def is_habit_exists(db_name, name: str) -> bool:
     """ Checks if the given habit name is present in the database
 
-    :param str db_name: Name of the database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :param str name: Name of the Habit to check
     :return: True if the habit present in the database, False otherwise
     :rtype: bool
     """
-
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("SELECT * FROM HabitData WHERE habit_name == ?", (name,))
-                sample_data = cursor.fetchone()
-                return True if sample_data is not None else False
+    with open_database(db_name) as database:
+        return database.is_habit_exists(name)
 
 
-def delete_habit(db_name: str, name: str) -> None:
+def delete_habit(db_name, name: str) -> None:
     """ Delete the given habit from the database
 
-    :param str db_name: Name of the database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :param str name: Name of the habit to delete
-    :return: Returns True if the habit is successfully deleted, False otherwise
+    :return: The function returns nothing
     """
+    with open_database(db_name) as database:
+        return database.delete_habit(name)
 
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("DELETE FROM HabitData WHERE habit_name == ?", (name,))
-                cursor.execute("DELETE FROM HabitHistory WHERE habit_name == ?", (name,))
-                con.commit()
-    return
+
+def rename_habit(db_name, old_name: str, new_name: str) -> None:
+    """ Renames the habit with a single update, the history stays with the habit_id
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param str old_name: Name of the habit to rename
+    :param str new_name: New name of the habit
+    :return: The function returns nothing
+    """
+    with open_database(db_name) as database:
+        return database.rename_habit(old_name, new_name)
 
 
-def load_habit_data(db_name: str) -> list:
+def load_habit_data(db_name) -> list:
     """ Loads the data from the given database
 
-    :param str db_name: Name of the database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :return: list of sql row objects
     :rtype: list
     """
+    with open_database(db_name) as database:
+        return database.load_habit_data()
+
+
+def load_habit_names(db_name) -> set:
+    """ Loads the names of all habits from the given database
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :return: set of habit names
+    :rtype: set
+    """
+    with open_database(db_name) as database:
+        return database.load_habit_names()
 
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            con.row_factory = sqlite3.Row
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("SELECT * FROM HabitData")
-                result = [row for row in cursor.fetchall()]
-                return result
 
+def iter_habits(db_name, chunk_size: int = 1000):
+    """ Streams the habits from the database with a single query, building each Habit object as its rows arrive.
 
-def load_habit_history(db_name: str) -> list:
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param int chunk_size: number of rows fetched at a time
+    :return: generator of Habit objects, in the order the habits were added
+    """
+    with open_database(db_name) as database:
+        yield from database.iter_habits(chunk_size)
+
+
+def load_habit_history(db_name) -> list:
     """ Loads habit history from the given database
 
-    :param str db_name : The name of the given database file
-    :return: a list of sql row objects
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :return: a list of habit name and history string pairs
     :rtype: list
     """
+    with open_database(db_name) as database:
+        return database.load_habit_history()
 
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            con.row_factory = sqlite3.Row
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("SELECT * FROM HabitHistory")
-                result = [row for row in cursor.fetchall()]
-                return result
+
+def iter_habit_metrics(db_name, today: int = None):
+    """ Calculates the streaks, breaks and stats of every habit in the database, without loading the histories.
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param int today: the date to calculate against, as a day ordinal (Default is current date)
+    :return: generator of habit name and HabitMetrics, ordered by habit name
+    :raises HabitError: Raises exception when irregularity is detected.
+    """
+    with open_database(db_name) as database:
+        yield from database.iter_habit_metrics(today)
 
 
-def update_habit_data(db_name, habit: Habit):
+def update_habit_data(db_name, habit: Habit, with_history: bool = False):
     """ Updates the habit data from the given object
 
-    :param str db_name: Name of the given database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :param Habit habit: Habit object to be updated
-    :return: True if successfully updated else false
-    :rtype: bool
+    :param bool with_history: also replaces the history with the history of the object, in the same transaction
+    :return: The function returns nothing
     """
-
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            con.row_factory = sqlite3.Row
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute(
-                    "UPDATE HabitData SET descr = ?, periodicity = ?, creation_date = ? WHERE habit_name == ?",
-                    (habit.description, habit.periodicity.value, habit.get_creation_date(), habit.name))
-    return
+    with open_database(db_name) as database:
+        return database.update_habit_data(habit, with_history)
 
 
 def update_habit_history(db_name, habit: Habit):
-    """ Updates the habit history data from the given Habit object
+    """ Replaces the habit history data with the history of the given Habit object
 
-    :param str db_name: Name of the given database file
+    :param db_name: Name of the database file, or an open HabitDatabase
     :param Habit habit: Habit object to be updated
-    :return: True if successfully updated, else returns false
-    :rtype: bool
+    :return: The function returns nothing
+    """
+    with open_database(db_name) as database:
+        return database.update_habit_history(habit)
+
+
+def save_habits(db_name, habits: list, deleted_names = (), renames = (), histories = None,
+                checkoffs = (), removed_checkoffs = ()):
+    """ Saves the data and history of the given habits, deletes the given habit names
+    and renames the given habits, in a single transaction.
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param list habits: list of Habit objects to be saved, added if they don't exist
+    :param deleted_names: names of the habits to be deleted
+    :param renames: pairs of the name in the database and the new name of the renamed habits
+    :param histories: Habit objects whose whole history is replaced, all the given habits if None
+    :param checkoffs: habit name and date pairs to be added to the histories, dates in "%Y-%m-%d" format
+    :param removed_checkoffs: habit name and date pairs to be removed from the histories
+    :return: The function returns nothing
     """
+    with open_database(db_name) as database:
+        return database.save_habits(habits, deleted_names, renames, histories, checkoffs, removed_checkoffs)
 
-    with clib.closing(sqlite3.connect(db_name)) as con:
-        with con:
-            con.row_factory = sqlite3.Row
-            with clib.closing(con.cursor()) as cursor:
-                cursor.execute("UPDATE HabitHistory SET history = ? WHERE habit_name == ?",
-                               (habit.get_history(), habit.name,))
-    return
+
+def add_checkoff(db_name, name: str, day: str):
+    """ Adds a single check off to the habit history
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param str name: Name of the habit
+    :param str day: date of the check off in "%Y-%m-%d" format
+    :return: The function returns nothing
+    """
+    with open_database(db_name) as database:
+        return database.add_checkoff(name, day)
+
+
+def add_checkoffs(db_name, checkoffs: list):
+    """ Adds many check offs to the habit history, in a single transaction
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param list checkoffs: list of habit name and date pairs, dates in "%Y-%m-%d" format
+    :return: The function returns nothing
+    """
+    with open_database(db_name) as database:
+        return database.add_checkoffs(checkoffs)
+
+
+def remove_checkoff(db_name, name: str, day: str):
+    """ Removes a single check off from the habit history
+
+    :param db_name: Name of the database file, or an open HabitDatabase
+    :param str name: Name of the habit
+    :param str day: date of the check off in "%Y-%m-%d" format
+    :return: The function returns nothing
+    """
+    with open_database(db_name) as database:
+        return database.remove_checkoff(name, day)
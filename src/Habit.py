@@ -1,6 +1,9 @@
 from enum import Enum
-from datetime import datetime
-import logging, math
+from array import array
+from typing import NamedTuple
+from datetime import datetime, date
+from functools import lru_cache
+import logging, operator
 
 
 class HabitPeriods(Enum):
@@ -24,7 +27,124 @@ class HabitError(Exception):
         super().__init__(message)
 
 
+def period_index(day: int, periodicity: HabitPeriods) -> int:
+    """ Maps a date to the index of its period, so that the distance between two dates is a subtraction.
+    Days are counted as day ordinals, weeks start on sunday, months as year * 12 + month, and years as the year.
+
+    :param int day: the date as a day ordinal
+    :param HabitPeriods periodicity: periodicity of the habit
+    :return: the index of the period containing the date
+    :rtype: int
+    """
+    if periodicity == HabitPeriods.DAILY:
+        return day
+    elif periodicity == HabitPeriods.WEEKLY:
+        # ordinal 7 is the first sunday
+        return day // 7
+    elif periodicity == HabitPeriods.MONTHLY:
+        day = date.fromordinal(day)
+        return day.year * 12 + day.month
+    elif periodicity == HabitPeriods.YEARLY:
+        return date.fromordinal(day).year
+    return 0
+
+
+def period_indexes(days, periodicity: HabitPeriods):
+    """ Maps a sequence of dates to the indexes of their periods, each date is mapped only once.
+
+    :param days: sequence of dates as day ordinals
+    :param HabitPeriods periodicity: periodicity of the habit
+    :return: sequence of period indexes
+    """
+    if periodicity == HabitPeriods.DAILY:
+        return days
+    elif periodicity == HabitPeriods.WEEKLY:
+        return [day // 7 for day in days]
+    return [period_index(day, periodicity) for day in days]
+
+
+def period_duration(recent_day: int, older_day: int, periodicity: HabitPeriods) -> int:
+    """ Calculates the number of periods between two given dates.
+    Weekly dates less than 7 days apart are counted as the same week.
+
+    :param int recent_day: The recent date to be subtracted from, as a day ordinal.
+    :param int older_day: The older date to be subtracted by, as a day ordinal.
+    :param HabitPeriods periodicity: periodicity of the habit
+    :return: The number of periods between two dates
+    :rtype: int
+    """
+    if periodicity == HabitPeriods.WEEKLY and recent_day - older_day < 7:
+        return 0
+    return period_index(recent_day, periodicity) - period_index(older_day, periodicity)
+
+
+def period_durations(days, periodicity: HabitPeriods) -> list:
+    """ Calculates the number of periods between each pair of consecutive dates.
+
+    :param days: sequence of dates as day ordinals
+    :param HabitPeriods periodicity: periodicity of the habit
+    :return: list of durations, one less than the number of dates
+    :rtype: list
+    """
+    indexes = period_indexes(days, periodicity)
+    durations = list(map(operator.sub, indexes[1:], indexes[:-1]))
+    if periodicity == HabitPeriods.WEEKLY:
+        durations = [0 if recent - older < 7 else time_diff
+                     for recent, older, time_diff in zip(days[1:], days, durations)]
+    return durations
+
+
+@lru_cache(maxsize = 4096)
+def parse_date(day: str) -> int:
+    """ Parses a date in "%Y-%m-%d" format into a day ordinal.
+    Recently parsed dates are cached, as the histories of the habits mostly share the same dates.
+
+    :param str day: date as a string in "%Y-%m-%d" format
+    :return: the date as a day ordinal
+    :rtype: int
+    :raises ValueError: when the string is not a valid date, same as datetime.strptime
+    """
+    if len(day) == 10 and day[4] == '-' and day[7] == '-' and day.isascii() \
+            and day[:4].isdigit() and day[5:7].isdigit() and day[8:].isdigit():
+        try:
+            return date(int(day[:4]), int(day[5:7]), int(day[8:])).toordinal()
+        except ValueError:
+            pass
+    # anything else goes through strptime, so it is accepted or rejected the same way as before
+    return datetime.strptime(day, '%Y-%m-%d').toordinal()
+
+
+def parse_history(history: str) -> array:
+    """ Parses a history string into an array of day ordinals
+
+    :param str history: History data as a string in "%Y-%m-%d,%Y-%m-%d" format
+    :return: array of day ordinals
+    :rtype: array
+    :raises ValueError: when any of the dates is not valid
+    """
+    return array('i', map(parse_date, history.split(',')))
+
+
+class HabitMetrics(NamedTuple):
+    # Analytical information of a habit, calculated at once by Habit.habit_metrics
+
+    current_streak: int
+    longest_streak: int
+    longest_break: int
+    total_breaks: int
+    total_checkoffs: int
+    total_duration: int
+
+
 class Habit:
+    # History is kept as a compact array of proleptic day ordinals (date.toordinal).
+    # Streak and break counters are built with one scan when first needed, and then kept up to date
+    # on every check off, as a tuple of (current run, longest streak, longest break, total breaks, irregular).
+    # A history loaded with set_history(lazy = True) is kept as the raw string until it is needed.
+    # The version is increased on every change of the history or periodicity, for caching the analytics.
+    # Habits can be weakly referenced, so the analytics cache doesn't keep them alive.
+    __slots__ = ('name', 'description', 'creation_date', 'version', '_periodicity', '_history', '_raw_history',
+                 '_counters', '_prev_counters', '__weakref__')
 
     def __init__(self, name: str, description: str = "", periodicity: HabitPeriods = HabitPeriods.DAILY,
                  creation_date: str = "", history: str = ""):
@@ -40,72 +160,178 @@ class Habit:
 
         self.name: str = name
         self.description: str = description
+        self._history: array = array('i')
+        self._raw_history: str | None = None
+        self.version: int = 0
         self.periodicity: HabitPeriods = periodicity
-        self.creation_date: datetime = datetime.now()
-        self.habit_history: list = []
 
         # loading the history data
         if history != "":
-            history = history.split(',')
-            for dates in history:
-                self.habit_history.append(datetime.strptime(dates, '%Y-%m-%d'))
+            self.set_history(history)
 
         # loading the creation date
         if creation_date != "":
-            self.creation_date = datetime.strptime(creation_date, '%Y-%m-%d')
+            self.creation_date: datetime = datetime.fromordinal(parse_date(creation_date))
+        else:
+            self.creation_date: datetime = datetime.now()
 
-    def __calculate_duration(self, recent_date: datetime, older_date: datetime) -> int:
-        """ Calculates the number of days between two given dates.
+    def copy(self) -> 'Habit':
+        """ Copies the habit, with its own history array. The counters are immutable tuples and are shared.
 
-        :param datetime recent_date: The recent date to be subtracted from.
-        :param datetime older_date: The older date to be subtracted by.
-        :return: The number of days between two dates
-        :rtype: float
+        :return: a copy of the habit that can be changed independently
+        :rtype: Habit
+        """
+        habit = Habit.__new__(Habit)
+        for slot in Habit.__slots__:
+            if slot != '__weakref__':
+                setattr(habit, slot, getattr(self, slot))
+        habit._history = array('i', self._history)
+        return habit
+
+    @property
+    def periodicity(self) -> HabitPeriods:
+        """ The periodicity of the habit"""
+        return self._periodicity
+
+    @periodicity.setter
+    def periodicity(self, periodicity: HabitPeriods) -> None:
+        """ Changes the periodicity, the counters are rebuilt as the durations depend on it"""
+        self._periodicity = periodicity
+        self.__invalidate()
+
+    @property
+    def habit_history(self) -> array:
+        """ The history of the habit as an array of day ordinals.
+        The array should only be changed through the methods of the class, so the counters stay valid.
         """
+        return self.__decoded()
 
-        time_diff = 0
-        if self.periodicity == HabitPeriods.DAILY:
-            time_diff = (recent_date - older_date).days
-        elif self.periodicity == HabitPeriods.WEEKLY:
-            days_inbetween = (recent_date - older_date).days
-            r = ((recent_date.weekday() + 1) % 7) + 1
-            o = ((older_date.weekday() + 1) % 7) + 1
-            time_diff = 0 if days_inbetween < 7 else math.ceil((days_inbetween - (r - 1) - (7 - o)) / 7)
-        elif self.periodicity == HabitPeriods.MONTHLY:
-            time_diff = (recent_date.year - older_date.year) * 12 + recent_date.month - older_date.month
-        elif self.periodicity == HabitPeriods.YEARLY:
-            time_diff = recent_date.year - older_date.year
-        return time_diff
+    @habit_history.setter
+    def habit_history(self, history) -> None:
+        """ Replaces the history with the given day ordinals, and rebuilds the counters"""
+        self._raw_history = None
+        self._history = array('i', history)
+        self.__invalidate()
 
-    def habit_streak(self):
-        """ Calculates the habit Streak of the Habit Object
+    def __decoded(self) -> array:
+        """ Returns the history array, decoding the raw history string first if it is still pending
 
-        :param: the function accepts no arguments.
-        :return: The current habit streak and longest habit streak.
-        :rtype: float, float
-        :raises HabitError: Raises exceptions when there is an irregularity in history
+        :return: the history as an array of day ordinals
+        :rtype: array
         """
-        current_streak = 1
-        longest_streak = 1
-        h_dates = self.habit_history
+        if self._raw_history is not None:
+            self._history = parse_history(self._raw_history)
+            self._raw_history = None
+        return self._history
 
+    def __invalidate(self) -> None:
+        """ Marks the counters for rebuilding, after the history or the periodicity has changed
+
+        :return: The function returns nothing
+        """
+        self._prev_counters = None
+        self._counters = None
+        self.version += 1
+
+    def __last_entry(self) -> int | None:
+        """ Returns the last entry of the history, without decoding a pending history string
+
+        :return: the last entry as a day ordinal, None if the history is empty
+        :rtype: int | None
+        """
+        raw = self._raw_history
+        if raw is not None:
+            return parse_date(raw[raw.rfind(',') + 1:])
+        return self._history[-1] if self._history else None
+
+    @staticmethod
+    def __next_counters(counters: tuple, time_diff: int) -> tuple:
+        """ Updates the counters with the duration between the last two entries of the history.
+
+        :param tuple counters: counters of the history before the last entry.
+        :param int time_diff: the duration between the last entry and the one before it.
+        :return: counters of the history including the last entry.
+        :rtype: tuple
+        """
+        current_streak, longest_streak, longest_break, total_breaks, irregular = counters
+        if time_diff == 1:
+            current_streak += 1
+            longest_streak = max(current_streak, longest_streak)
+        elif time_diff < 0:
+            irregular = True
+        else:
+            current_streak = 1
+            if time_diff > 1:
+                total_breaks += 1
+                longest_break = max(time_diff - 1, longest_break)
+        return current_streak, longest_streak, longest_break, total_breaks, irregular
+
+    def __rebuild_counters(self) -> None:
+        """ Rebuilds the counters with a single scan over the history.
+        The counters before the last entry are kept as well, so the last entry can be unchecked.
+
+        :return: The function returns nothing
+        """
+        h_dates = self._history
+        self._prev_counters = None
+        self._counters = None
         if not h_dates:
-            return 0, 0
+            return
 
-        for i in range(1, len(h_dates)):
+        durations = period_durations(h_dates, self._periodicity)
 
-            time_diff = self.__calculate_duration(h_dates[i], h_dates[i-1])
+        # same steps as __next_counters, kept inline as this is the hot loop of loading a history
+        current_streak, longest_streak, longest_break, total_breaks, irregular = 1, 1, 1, 0, False
+        for time_diff in durations[:-1]:
             if time_diff == 1:
                 current_streak += 1
-                longest_streak = max(current_streak, longest_streak)
+                if current_streak > longest_streak:
+                    longest_streak = current_streak
             elif time_diff < 0:
-                logging.error("Irregular dates")
-                raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+                irregular = True
             else:
                 current_streak = 1
+                if time_diff > 1:
+                    total_breaks += 1
+                    if time_diff - 1 > longest_break:
+                        longest_break = time_diff - 1
+
+        counters = (current_streak, longest_streak, longest_break, total_breaks, irregular)
+        if durations:
+            self._prev_counters = counters
+            counters = self.__next_counters(counters, durations[-1])
+        self._counters = counters
+
+    def __check_counters(self) -> tuple:
+        """ Returns the counters of the history
+
+        :return: current run, longest streak, longest break, total breaks, irregular flag.
+        :rtype: tuple
+        :raises HabitError: Raises exceptions when there is an irregularity in history
+        """
+        if self._counters is None:
+            self.__rebuild_counters()
+        counters = self._counters
+        if counters[4]:
+            logging.error("Irregular dates")
+            raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+        return counters
+
+    def habit_streak(self):
+        """ Calculates the habit Streak of the Habit Object
+
+        :param: the function accepts no arguments.
+        :return: The current habit streak and longest habit streak.
+        :rtype: float, float
+        :raises HabitError: Raises exceptions when there is an irregularity in history
+        """
+        if not self.__decoded():
+            return 0, 0
+
+        current_streak, longest_streak, _, _, _ = self.__check_counters()
 
         # difference between today and the last entry
-        diff = self.__calculate_duration(datetime.now(), h_dates[-1])
+        diff = period_duration(datetime.now().toordinal(), self._history[-1], self._periodicity)
         if diff > 1:
             current_streak = 0
         elif diff < 0:
@@ -122,27 +348,13 @@ class Habit:
         :rtype: float, float
         :raises HabitError: Raises exception when irregularity is detected.
         """
-
-        total_breaks = 0
-        longest_break = 1
-        h_dates = self.habit_history
-
-        if not h_dates:
+        if not self.__decoded():
             return 0, 0
 
-        for i in range(1, len(h_dates)):
-
-            time_diff = self.__calculate_duration(h_dates[i], h_dates[i-1])
-            if time_diff > 1:
-                total_breaks += 1
-                current_break = time_diff - 1
-                longest_break = max(current_break, longest_break)
-            elif time_diff < 0:
-                logging.error("Irregular dates")
-                raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+        _, _, longest_break, total_breaks, _ = self.__check_counters()
 
         # difference between today and the last entry
-        diff = self.__calculate_duration(datetime.now(), h_dates[-1])
+        diff = period_duration(datetime.now().toordinal(), self._history[-1], self._periodicity)
         if diff > 1:
             total_breaks += 1
             current_break = diff - 1
@@ -161,14 +373,16 @@ class Habit:
         :raises HabitError: when irregularities found in the Habit history.
         """
 
-        if not self.habit_history:
+        if self._raw_history is not None:
+            total_checkoffs = self._raw_history.count(',') + 1
+        elif not self._history:
             return 0, 0
+        else:
+            total_checkoffs = len(self._history)
     
-        total_checkoffs = len(self.habit_history)
-    
-        first_entry = self.creation_date
-        last_entry = datetime.now()
-        total_duration: int = self.__calculate_duration(last_entry, first_entry)
+        first_entry = self.creation_date.toordinal()
+        last_entry = datetime.now().toordinal()
+        total_duration: int = period_duration(last_entry, first_entry, self._periodicity)
         
         if total_duration < 0:
             logging.error("Irregular dates")
@@ -176,6 +390,84 @@ class Habit:
     
         return total_checkoffs, total_duration + 1
 
+    def habit_metrics(self, today: int = None) -> HabitMetrics:
+        """ Calculates the streaks, breaks and stats of the habit at once, against a single date for today.
+
+        :param int today: the date to calculate against, as a day ordinal (Default is current date)
+        :return: current streak, longest streak, longest break, total breaks, total check offs and total duration.
+        :rtype: HabitMetrics
+        :raises HabitError: Raises exception when irregularity is detected.
+        """
+        if not self.__decoded():
+            return HabitMetrics(0, 0, 0, 0, 0, 0)
+
+        if today is None:
+            today = datetime.now().toordinal()
+        current_streak, longest_streak, longest_break, total_breaks, _ = self.__check_counters()
+
+        # difference between today and the last entry
+        diff = period_duration(today, self._history[-1], self._periodicity)
+        if diff > 1:
+            current_streak = 0
+            total_breaks += 1
+            longest_break = max(diff - 1, longest_break)
+        elif diff < 0:
+            logging.error("Irregular dates")
+            raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+
+        total_duration = period_duration(today, self.creation_date.toordinal(), self._periodicity)
+        if total_duration < 0:
+            logging.error("Irregular dates")
+            raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+
+        return HabitMetrics(current_streak, longest_streak, longest_break, total_breaks,
+                            len(self._history), total_duration + 1)
+
+    def current_streak(self, today: int = None) -> int:
+        """ Calculates the current streak of the habit.
+        A pending history string is only decoded from its end, as far back as the streak goes,
+        so irregular dates before the current streak are not detected here.
+
+        :param int today: the date to calculate against, as a day ordinal (Default is current date)
+        :return: the current habit streak
+        :rtype: int
+        :raises HabitError: Raises exceptions when there is an irregularity in history
+        """
+        if today is None:
+            today = datetime.now().toordinal()
+
+        raw = self._raw_history
+        if raw is None:
+            if not self._history:
+                return 0
+            current_streak = self.__check_counters()[0]
+            last_entry = self._history[-1]
+        else:
+            start = raw.rfind(',') + 1
+            last_entry = recent = parse_date(raw[start:])
+            current_streak = 1
+            while start > 0:
+                end = start - 1
+                start = raw.rfind(',', 0, end) + 1
+                older = parse_date(raw[start:end])
+                time_diff = period_duration(recent, older, self._periodicity)
+                if time_diff < 0:
+                    logging.error("Irregular dates")
+                    raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+                if time_diff != 1:
+                    break
+                current_streak += 1
+                recent = older
+
+        # difference between today and the last entry
+        diff = period_duration(today, last_entry, self._periodicity)
+        if diff > 1:
+            return 0
+        elif diff < 0:
+            logging.error("Irregular dates")
+            raise HabitError("Error: Irregular dates in " + self.name + "\n Try resetting the history.")
+        return current_streak
+
     def is_checked_off(self) -> bool:
         """ Checks to see if the given Habit is checked off for today.
 
@@ -183,13 +475,13 @@ class Habit:
         :rtype: bool
         """
 
-        if not self.habit_history:
+        last_entry = self.__last_entry()
+        if last_entry is None:
             return False
 
-        today = datetime.now()
-        last_entry = self.habit_history[-1]
+        today = datetime.now().toordinal()
 
-        total_duration = self.__calculate_duration(today, last_entry)
+        total_duration = period_duration(today, last_entry, self._periodicity)
 
         if total_duration == 0:
             return True
@@ -203,12 +495,25 @@ class Habit:
         :rtype: bool
         """
 
-        if not self.is_checked_off():
-            self.habit_history.append(datetime.now())
-            return True
-        else:
+        if self.is_checked_off():
             return False
 
+        today = datetime.now().toordinal()
+        if self._raw_history is not None:
+            self._raw_history += ',' + date.fromordinal(today).isoformat()
+        else:
+            if not self._history:
+                self._prev_counters = None
+                self._counters = (1, 1, 1, 0, False)
+            elif self._counters is not None:
+                self._prev_counters = self._counters
+                self._counters = self.__next_counters(self._counters,
+                                                      period_duration(today, self._history[-1], self._periodicity))
+            self._history.append(today)
+        # the version changes after the history, so results cached for the new version are never stale
+        self.version += 1
+        return True
+
     def uncheck_habit(self) -> bool:
         """ Uncheck off the given Habit object for today
 
@@ -217,7 +522,15 @@ class Habit:
         """
         if not self.is_checked_off():
             return False
-        self.habit_history.pop()
+        raw = self._raw_history
+        if raw is not None:
+            cut = raw.rfind(',')
+            self._raw_history = raw[:cut] if cut > 0 else None
+        else:
+            self._history.pop()
+            self._counters = self._prev_counters
+            self._prev_counters = None
+        self.version += 1
         return True
 
     def get_history(self) -> str:
@@ -227,30 +540,65 @@ class Habit:
         :rtype: str
         """
 
-        history = []
-        if not self.habit_history:
+        if self._raw_history is not None:
+            return self._raw_history
+        if not self._history:
+            return ""
+        return ','.join([date.fromordinal(day).isoformat() for day in self._history])
+
+    def checkoff_count(self) -> int:
+        """ Counts the check offs in the history, without decoding a pending history string
+
+        :return: number of check offs
+        :rtype: int
+        """
+        if self._raw_history is not None:
+            return self._raw_history.count(',') + 1
+        return len(self._history)
+
+    def get_last_entry(self) -> str:
+        """ Exports the last entry of the history as a string
+
+        :return: the last entry in "%Y-%m-%d" format, empty string if the history is empty
+        :rtype: str
+        """
+        raw = self._raw_history
+        if raw is not None:
+            return raw[raw.rfind(',') + 1:]
+        if not self._history:
             return ""
-        for date in self.habit_history:
-            history.append(datetime.strftime(date, '%Y-%m-%d'))
-        return ','.join(history)
+        return date.fromordinal(self._history[-1]).isoformat()
 
-    def set_history(self, history: str):
+    def set_history(self, history: str, lazy: bool = False):
         """ Imports history data from a string
 
         :param str history: History data as a string in "%Y-%m-%d,%Y-%m-%d" format
+        :param bool lazy: keeps the string as it is, and decodes it only when the full history is needed.
+            The dates are not validated until then, so it is meant for trusted data such as the database.
         :return: returns True if string is successfully imported, False otherwise.
         :rtype: bool
         """
 
         if history == "":
             return False
-        history = history.split(',')
-        dates = []
-        for date in history:
-            dates.append(datetime.strptime(date, '%Y-%m-%d'))
-        self.habit_history = dates
+        if lazy:
+            self._raw_history = history
+            self._history = array('i')
+        else:
+            self._history = parse_history(history)
+            self._raw_history = None
+        self.__invalidate()
         return True
 
+    def reset_history(self) -> None:
+        """ Clears the history data of the object
+
+        :return: The function returns nothing
+        """
+        self._raw_history = None
+        self._history = array('i')
+        self.__invalidate()
+
     def get_creation_date(self) -> str:
         """ Exports creation date as a string
 
@@ -1,19 +1,267 @@
+import time
+import heapq
+import bisect
+import logging
+import threading
+from itertools import islice
+from types import MappingProxyType
 from src.Database import *
 from src.SampleData import sample_habits
 
 
+class CheckOffOutcome(Enum):
+    # Outcome of checking off a single habit
+
+    CHECKED_OFF = 'checked off'
+    ALREADY_CHECKED_OFF = 'already checked off'
+    NOT_FOUND = 'not found'
+
+
+class Reconciliation(NamedTuple):
+    # Differences between the habits of a habit manager and its database, found by HabitManager.reconcile
+
+    missing_in_database: list
+    missing_in_manager: list
+
+
 class HabitManager:
+    # The loaded habits are the index of which habits exist, the database is not asked again on every call.
+    # Changes made to the database by someone else are found by reconcile(), which is run after loading
+    # and on close() with consistency_check.
+    #
+    # By default every change is written to the database before the method returns.
+    #
+    # With write_behind, changes are only made in memory and the changed habits are marked dirty.
+    # A renamed habit is not dirty, its name in the database is kept in _renamed and it is renamed by the flush.
+    # Check offs are kept in _checkoffs as the days added and removed of each habit, and the flush applies them
+    # one row at a time, so a check off costs the same with write_behind as without. The whole history is only
+    # written again for the habits in _rewrite: new habits, and habits reset or given a new periodicity.
+    # All dirty, deleted and renamed habits are saved by flush(), which is called explicitly, when flush_count habits
+    # are dirty, when the next change or flush_if_due() comes flush_age seconds after the first unsaved one,
+    # on close(), and when the main loop of the CLI exits. The CLI calls flush_if_due() before every menu.
+    # Crash safety of write_behind:
+    # - a flush is a single transaction, so the database always holds the state of the last successful flush,
+    #   and each habit is saved with its data and history together
+    # - a failed flush changes nothing in the database, and the habits stay dirty for the next flush
+    # - changes made since the last flush are lost if the process dies before the next flush;
+    #   at most flush_count habits, but the age is only checked on the next change or flush_if_due(),
+    #   so an idle manager keeps its changes in memory until one of them, flush() or close()
+    #
+    # A habit is changed in memory and in the database while holding the lock of its stripe, so changes of
+    # the same habit from many threads are applied one at a time, in the same order in memory and in the database.
+    # Methods changing many habits take the locks of their stripes in ascending order, and the lock of the
+    # dirty habits is always taken after the stripes. With thread_safe, the database is a ThreadedHabitDatabase,
+    # with a single writer thread and a reading connection for each thread.
+    #
+    # query() is served from secondary indexes instead of a scan of the habits: the names of each periodicity
+    # in sorted lists, the (negated current streak, name) pairs of each periodicity in sorted lists, and the set of
+    # habits checked off for the current period. Changes only mark the habit stale, and the stale habits are
+    # indexed again by the next query. The streaks and check offs depend on the date, so the first query of
+    # every day builds the indexes again from all habits.
+    #
+    # data_as_dict() hands out a read only view of the habits dict, shared until the next change. The first change
+    # after that copies the dict, and a habit object still shared with the view is copied before it is changed,
+    # so the view keeps the state it was taken at while the manager goes on.
+    #
+    # The version is increased on every change of the habits, so views of the habits can be kept until it changes.
 
-    def __init__(self, db_name: str = 'habit_data.db') -> None:
+    def __init__(self, db_name: str = 'habit_data.db', tuning: DatabaseTuning | str | None = None,
+                 write_behind: bool = False, flush_count: int = 100, flush_age: float = 5.0,
+                 consistency_check: bool = False, thread_safe: bool = False, lock_stripes: int = 64) -> None:
         """ Initializes the database connection for habit manager class
 
         :param str db_name: the name of the database file
+        :param tuning: DatabaseTuning or the name of a profile in TUNING_PROFILES, None keeps the SQLite defaults
+        :param bool write_behind: keeps the changes in memory, and saves them at once with flush()
+        :param int flush_count: number of dirty habits that triggers a flush, with write_behind
+        :param float flush_age: age in seconds of the oldest unsaved change that triggers a flush, with write_behind.
+            The age is only checked on the next change and by flush_if_due(), there is no timer.
+        :param bool consistency_check: reconciles the habits with the database after loading and on close
+        :param bool thread_safe: allows the habit manager to be used by many threads at once
+        :param int lock_stripes: number of locks the habits are spread over
         """
         self.habits = {}
-        self.db_name = db_name
-        initialize_database(db_name = db_name)
+        if thread_safe:
+            self.database = ThreadedHabitDatabase(db_name, tuning if tuning is not None else 'wal')
+        else:
+            self.database = HabitDatabase(db_name, tuning)
+        self.database.initialize()
+        self._stripes = [threading.RLock() for _ in range(lock_stripes)]
+        self._lock = threading.RLock()
+        self.write_behind = write_behind
+        self.flush_count = flush_count
+        self.flush_age = flush_age
+        self._dirty = set()
+        self._deleted = set()
+        self._renamed = {}
+        self._checkoffs = {}
+        self._rewrite = set()
+        self._dirty_since = None
+        self.consistency_check = consistency_check
+        self.version = 0
+        self._index_day = None
+        self._stale = set()
+        self._indexed = {}
+        self._names = {periodicity: [] for periodicity in HabitPeriods}
+        self._streaks = None
+        self._checked = set()
+        self._snapshot = None
+        self._snapshot_habits = None
+        return
+
+    def close(self) -> None:
+        """ Saves the unsaved changes, and closes the database connection of the habit manager
+
+        :return: the function returns nothing
+        """
+        try:
+            self.flush()
+            if self.consistency_check:
+                self.reconcile()
+        finally:
+            self.database.close()
         return
 
+    @clib.contextmanager
+    def __locked(self, names = None):
+        """ Holds the locks of the stripes of the given habit names, taken in ascending order
+
+        :param names: habit names, None for all stripes
+        :return: context manager holding the locks
+        """
+        if names is None:
+            stripes = range(len(self._stripes))
+        else:
+            stripes = sorted({hash(name) % len(self._stripes) for name in names})
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def flush(self) -> int:
+        """ Saves all dirty, deleted and renamed habits and the check offs to the database, in a single transaction.
+        If saving fails, the database is left as it was and the habits stay dirty.
+
+        :return: the number of habits saved, deleted or renamed
+        :rtype: int
+        """
+        with self._lock:
+            if not self._dirty and not self._deleted and not self._renamed and not self._checkoffs:
+                return 0
+            # saved in the order of the habits, so new habits are added to the database in the order they were added
+            habits = [habit for name, habit in self.habits.items() if name in self._dirty]
+            checkoffs = [(name, day) for name, days in self._checkoffs.items() for day, added in days.items() if added]
+            removed = [(name, day) for name, days in self._checkoffs.items() for day, added in days.items() if not added]
+            self.database.save_habits(habits, self._deleted,
+                                      [(db_name, name) for name, db_name in self._renamed.items()],
+                                      [habit for habit in habits if habit.name in self._rewrite],
+                                      checkoffs, removed)
+            count = len(self._dirty | self._renamed.keys() | self._checkoffs.keys()) + len(self._deleted)
+            self._dirty = set()
+            self._deleted = set()
+            self._renamed = {}
+            self._checkoffs = {}
+            self._rewrite = set()
+            self._dirty_since = None
+        return count
+
+    def reconcile(self) -> Reconciliation:
+        """ Compares the habits with the database in a single query. Unsaved changes of write_behind are not differences.
+        The differences are logged as errors.
+
+        :return: names of the habits missing in the database, and the names of the habits missing in the manager
+        :rtype: Reconciliation
+        """
+        with self._lock:
+            db_names = self.database.load_habit_names()
+            result = Reconciliation(
+                sorted(name for name in list(self.habits)
+                       if name not in db_names and name not in self._dirty and name not in self._renamed),
+                sorted(name for name in db_names
+                       if name not in self.habits and name not in self._deleted
+                       and name not in self._renamed.values()))
+        if result.missing_in_database:
+            logging.error("Habits missing in the database: " + ", ".join(result.missing_in_database))
+        if result.missing_in_manager:
+            logging.error("Habits missing in the habit manager: " + ", ".join(result.missing_in_manager))
+        return result
+
+    def __changed(self, *names) -> None:
+        """ Marks the habits stale for the indexes, and increases the version of the habit manager
+
+        :param names: names of the changed habits
+        :return: the function returns nothing
+        """
+        self._stale.update(names)
+        with self._lock:
+            self.version += 1
+        return
+
+    def __mark_dirty(self, name: str, deleted: bool = False, renamed_from: str | None = None,
+                     checkoff: tuple | None = None, rewrite: bool = False) -> None:
+        """ Marks the habit as changed, and flushes when the count or age threshold is reached
+
+        :param str name: name of the habit
+        :param bool deleted: True if the habit was deleted
+        :param renamed_from: the old name of the habit, if it was renamed
+        :param checkoff: the date in "%Y-%m-%d" format and True if it was checked off, False if it was unchecked
+        :param bool rewrite: True if the whole history is to be written again
+        :return: the function returns nothing
+        """
+        with self._lock:
+            if checkoff is not None:
+                # the habits written again are saved with their whole history
+                if name not in self._rewrite:
+                    day, added = checkoff
+                    self._checkoffs.setdefault(name, {})[day] = added
+            elif renamed_from is not None:
+                # the habit keeps the name it has in the database, unless it was added after that name was deleted
+                db_name = self._renamed.pop(renamed_from, None)
+                if db_name is None and renamed_from not in self._deleted:
+                    db_name = renamed_from
+                if db_name is not None:
+                    self._renamed[name] = db_name
+                if renamed_from in self._dirty:
+                    self._dirty.discard(renamed_from)
+                    self._dirty.add(name)
+                if renamed_from in self._checkoffs:
+                    self._checkoffs[name] = self._checkoffs.pop(renamed_from)
+                if renamed_from in self._rewrite:
+                    self._rewrite.discard(renamed_from)
+                    self._rewrite.add(name)
+            elif deleted:
+                self._dirty.discard(name)
+                self._checkoffs.pop(name, None)
+                self._rewrite.discard(name)
+                self._deleted.add(self._renamed.pop(name, name))
+            else:
+                self._dirty.add(name)
+                if rewrite:
+                    self._rewrite.add(name)
+                    self._checkoffs.pop(name, None)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            if len(self._dirty) + len(self._deleted) + len(self._renamed) + len(self._checkoffs) >= self.flush_count:
+                self.flush()
+            else:
+                self.flush_if_due()
+        return
+
+    def flush_if_due(self) -> int:
+        """ Saves the unsaved changes if the oldest of them is at least flush_age seconds old.
+        Meant to be called regularly, as the age is otherwise only checked on the next change.
+
+        :return: the number of habits saved, deleted or renamed
+        :rtype: int
+        """
+        with self._lock:
+            if self._dirty_since is None or time.monotonic() - self._dirty_since < self.flush_age:
+                return 0
+            return self.flush()
+
     def add_habit_obj(self, habit: Habit) -> bool:
         """ Adds the habit object to the Habit manager
 
@@ -21,46 +269,58 @@ class HabitManager:
         :return: True if successfully added, false otherwise:
         :rtype: bool
         """
-        if self.is_habit_exist(habit.name):
-            return False
-        self.habits[habit.name] = habit
-        add_habit_to_db(self.db_name, habit)
-        return True
+        with self.__locked((habit.name,)):
+            if self.is_habit_exist(habit.name):
+                return False
+            self.__copy_on_write()
+            self.habits[habit.name] = habit
+            self.__changed(habit.name)
+            if self.write_behind:
+                self.__mark_dirty(habit.name, rewrite = True)
+            else:
+                self.database.add_habit(habit)
+            return True
 
-    def load_habits_from_db(self) -> None:
+    def load_habits_from_db(self, progress = None, chunk_size: int = 1000) -> None:
         """ Loads Habit data from the database files to the habit classes
 
+        :param progress: optional function called with the number of habits loaded so far,
+            after every chunk_size habits and once at the end
+        :param int chunk_size: number of database rows fetched at a time
         :return: the function returns nothing
         """
-        self.habits = {}
-        data_list = load_habit_data(self.db_name)
-        for data in data_list:
-            habit = Habit(data[0], data[1], HabitPeriods(data[2]), data[3])
-            self.habits[data[0]] = habit
-
-        history_list = load_habit_history(self.db_name)
-        for name, history in history_list:
-            if name in self.habits:
-                self.habits[name].set_history(history)
-
-        if len(self.habits) < 1:
-            sample_list = sample_habits()
-            for sample in sample_list:
-                self.add_habit_obj(sample)
-        return
+        with self.__locked(None):
+            self.flush()
+            self.habits = {}
+            self._snapshot = None
+            self._snapshot_habits = None
+            self._index_day = None
+            self.__changed()
+            count = 0
+            for habit in self.database.iter_habits(chunk_size):
+                self.habits[habit.name] = habit
+                count += 1
+                if progress is not None and count % chunk_size == 0:
+                    progress(count)
+            if progress is not None and count % chunk_size != 0:
+                progress(count)
+            if self.consistency_check:
+                self.reconcile()
+
+            if len(self.habits) < 1:
+                sample_list = sample_habits()
+                for sample in sample_list:
+                    self.add_habit_obj(sample)
+            return
 
     def is_habit_exist(self, name: str) -> bool:
-        """ Checks weather if the given habit name exists
+        """ Checks weather if the given habit name exists, in the loaded habits
 
         :param str name: habit name
         :return: True if habit name exists, false otherwise
         :rtype: bool
         """
-        if name not in self.habits:
-            return False
-        if not is_habit_exists(self.db_name, name):
-            return False
-        return True
+        return name in self.habits
 
     def add_habit(self, name: str, desc: str = "",
                   periodicity: HabitPeriods = HabitPeriods.DAILY, history: str = "") -> bool:
@@ -73,14 +333,20 @@ class HabitManager:
         :return: True if successfully added, False otherwise.
         :rtype: bool
         """
-        if self.is_habit_exist(name):
-            return False
-        habit_obj = Habit(name, desc, periodicity)
-        if history != "":
-            habit_obj.set_history(history)
-        self.habits[name] = habit_obj
-        add_habit_to_db(self.db_name, habit_obj)
-        return True
+        with self.__locked((name,)):
+            if self.is_habit_exist(name):
+                return False
+            habit_obj = Habit(name, desc, periodicity)
+            if history != "":
+                habit_obj.set_history(history)
+            self.__copy_on_write()
+            self.habits[name] = habit_obj
+            self.__changed(name)
+            if self.write_behind:
+                self.__mark_dirty(name, rewrite = True)
+            else:
+                self.database.add_habit(habit_obj)
+            return True
 
     def delete_habit(self, name: str) -> bool:
         """ Deletes the habit from the application
@@ -89,32 +355,53 @@ class HabitManager:
         :return: True if successfully deleted, False otherwise.
         :rtype: bool
         """
-        if not self.is_habit_exist(name):
-            return False
-        delete_habit(self.db_name, name)
-        del self.habits[name]
-        return True
+        with self.__locked((name,)):
+            if not self.is_habit_exist(name):
+                return False
+            self.__copy_on_write()
+            del self.habits[name]
+            self.__changed(name)
+            if self.write_behind:
+                self.__mark_dirty(name, deleted = True)
+            else:
+                self.database.delete_habit(name)
+            return True
 
     def edit_habit_name(self, old_name: str, new_name: str) -> bool:
-        """ Changes the name of the habit
+        """ Changes the name of the habit. The habit object is kept, and the database is changed with a single update,
+        so the history is neither copied nor written again.
 
         :param old_name: old name of the habit
         :param new_name: new name of the habit
         :return: True if changed successfully, False otherwise
         :rtype: bool
         """
-        if not self.is_habit_exist(old_name):
-            return False
-        if self.is_habit_exist(new_name):
-            return False
-        old = self.habits[old_name]
-        new_habit_obj = Habit(new_name, old.description, old.periodicity,
-                              old.get_creation_date(), old.get_history())
-        self.habits[new_name] = new_habit_obj
+        with self.__locked((old_name, new_name)):
+            if not self.is_habit_exist(old_name):
+                return False
+            if self.is_habit_exist(new_name):
+                return False
+            if self.write_behind:
+                self.__rekey(old_name, new_name)
+                self.__mark_dirty(new_name, renamed_from = old_name)
+            else:
+                self.database.rename_habit(old_name, new_name)
+                self.__rekey(old_name, new_name)
+            return True
+
+    def __rekey(self, old_name: str, new_name: str) -> None:
+        """ Gives the habit object its new name, and moves it to the new key of the habits
+
+        :param old_name: old name of the habit
+        :param new_name: new name of the habit
+        :return: the function returns nothing
+        """
+        habit_obj = self.__copy_on_write(old_name)
         del self.habits[old_name]
-        delete_habit(self.db_name, old_name)
-        add_habit_to_db(self.db_name, new_habit_obj)
-        return True
+        habit_obj.name = new_name
+        self.habits[new_name] = habit_obj
+        self.__changed(old_name, new_name)
+        return
 
     def edit_habit_description(self, name: str, desc: str) -> bool:
         """ Changes the description of the habit
@@ -124,12 +411,17 @@ class HabitManager:
         :return: True if changed successfully, False otherwise.
         :rtype: bool
         """
-        if not self.is_habit_exist(name):
-            return False
-        habit_obj = self.habits[name]
-        habit_obj.description = desc
-        update_habit_data(self.db_name, habit_obj)
-        return True
+        with self.__locked((name,)):
+            if not self.is_habit_exist(name):
+                return False
+            habit_obj = self.__copy_on_write(name)
+            habit_obj.description = desc
+            self.__changed()
+            if self.write_behind:
+                self.__mark_dirty(name)
+            else:
+                self.database.update_habit_data(habit_obj)
+            return True
 
     def edit_habit_periodicity(self, name, periodicity):
         """ Changes the periodicity of the habit.
@@ -139,13 +431,18 @@ class HabitManager:
         :param periodicity: new periodicity of the habit
         :return: True if successfully changed, False otherwise.
         """
-        if not self.is_habit_exist(name):
-            return False
-        habit_obj = self.habits[name]
-        habit_obj.periodicity = periodicity
-        habit_obj.habit_history = []
-        update_habit_data(self.db_name, habit_obj)
-        return True
+        with self.__locked((name,)):
+            if not self.is_habit_exist(name):
+                return False
+            habit_obj = self.__copy_on_write(name)
+            habit_obj.periodicity = periodicity
+            habit_obj.reset_history()
+            self.__changed(name)
+            if self.write_behind:
+                self.__mark_dirty(name, rewrite = True)
+            else:
+                self.database.update_habit_data(habit_obj, True)
+            return True
 
     def edit_habit_reset(self, name) -> bool:
         """ Resets the history of the habit
@@ -154,27 +451,53 @@ class HabitManager:
         :return: returns True if the reset is successful. False otherwise.
         :rtype: bool
         """
-        if not self.is_habit_exist(name):
-            return False
-        habit_obj = self.habits[name]
-        habit_obj.habit_history = []
-        update_habit_history(self.db_name, habit_obj)
-        return True
+        with self.__locked((name,)):
+            if not self.is_habit_exist(name):
+                return False
+            habit_obj = self.__copy_on_write(name)
+            habit_obj.reset_history()
+            self.__changed(name)
+            if self.write_behind:
+                self.__mark_dirty(name, rewrite = True)
+            else:
+                self.database.update_habit_history(habit_obj)
+            return True
 
-    def check_off_habits(self, habit_list: list) -> bool:
-        """ Checks off the list of habits for today
+    def check_off_habits(self, habit_list: list) -> dict:
+        """ Checks off the list of habits for today.
+        The check offs are saved in a single transaction, if saving fails none of the habits are checked off.
+        With write_behind, the habits are marked dirty instead.
 
-        :param list habit_list: list of habit names to be checked off
-        :return: True if successfully changed.
+        :param list habit_list: list of habit names to be checked off, a repeated name is checked off once
+        :return: dictionary of habit names and their CheckOffOutcome, empty if the list is empty
+        :rtype: dict
         """
+        outcomes = {}
         if not habit_list:
-            return False
-        for habit_name in habit_list:
-            if self.is_habit_exist(habit_name):
-                habit_obj = self.habits[habit_name]
-                habit_obj.check_off()
-                update_habit_history(self.db_name, habit_obj)
-        return True
+            return outcomes
+        habit_list = list(dict.fromkeys(habit_list))
+        with self.__locked(habit_list):
+            checked = []
+            for habit_name in habit_list:
+                if habit_name not in self.habits:
+                    outcomes[habit_name] = CheckOffOutcome.NOT_FOUND
+                elif self.__copy_on_write(habit_name).check_off():
+                    outcomes[habit_name] = CheckOffOutcome.CHECKED_OFF
+                    checked.append(self.habits[habit_name])
+                else:
+                    outcomes[habit_name] = CheckOffOutcome.ALREADY_CHECKED_OFF
+            self.__changed(*(habit_obj.name for habit_obj in checked))
+            if self.write_behind:
+                for habit_obj in checked:
+                    self.__mark_dirty(habit_obj.name, checkoff = (habit_obj.get_last_entry(), True))
+                return outcomes
+            try:
+                self.database.add_checkoffs([(habit_obj.name, habit_obj.get_last_entry()) for habit_obj in checked])
+            except sqlite3.Error:
+                for habit_obj in checked:
+                    habit_obj.uncheck_habit()
+                raise
+            return outcomes
 
     def uncheck_habit(self, name: str):
         """ Unchecks the given habit for today
@@ -183,20 +506,180 @@ class HabitManager:
         :return: True if the habit is successfully unchecked. False otherwise.
         :rtype: bool
         """
-        if name not in self.habits:
-            return False
-        habit_obj = self.habits[name]
-        if not habit_obj.is_checked_off():
-            return False
-        habit_obj.uncheck_habit()
-        update_habit_history(self.db_name, habit_obj)
-        return True
-
-    def data_as_dict(self):
-        """ Returns the habit data as a dictionary of habit objects.
+        with self.__locked((name,)):
+            if name not in self.habits:
+                return False
+            if not self.habits[name].is_checked_off():
+                return False
+            habit_obj = self.__copy_on_write(name)
+            day = habit_obj.get_last_entry()
+            habit_obj.uncheck_habit()
+            self.__changed(name)
+            if self.write_behind:
+                self.__mark_dirty(name, checkoff = (day, False))
+            else:
+                self.database.remove_checkoff(name, day)
+            return True
+
+    def query(self, periodicity: HabitPeriods | None = None, checked: bool | None = None,
+              order_by: str = 'name', limit: int | None = None, offset: int = 0) -> list:
+        """ Finds the names of the habits from the indexes, without going through all habits
+
+        :param periodicity: only habits of this periodicity, None for all
+        :param checked: True for habits checked off for the current period, False for the unchecked, None for all
+        :param str order_by: 'name' in alphabetical order, 'streak' for the longest current streak first,
+            habits with the same streak in alphabetical order
+        :param limit: maximum number of names, None for all
+        :param int offset: number of names skipped from the start
+        :return: list of habit names
+        :rtype: list
+        :raises ValueError: Raises exception when order_by is unknown
+        """
+        if order_by not in ('name', 'streak'):
+            raise ValueError(f"Invalid order_by: {order_by}")
+        periods = list(HabitPeriods) if periodicity is None else [periodicity]
+        with self.__locked(None):
+            self.__refresh_indexes()
+            if order_by == 'streak':
+                self.__build_streaks()
+                names = (name for _, name in heapq.merge(*(self._streaks[period] for period in periods)))
+            elif checked:
+                names = iter(sorted(name for name in self._checked if self._indexed[name][0] in periods))
+            else:
+                names = heapq.merge(*(self._names[period] for period in periods))
+            if checked is not None:
+                names = (name for name in names if (name in self._checked) == checked)
+            return list(islice(names, offset, None if limit is None else offset + limit))
+
+    def __refresh_indexes(self) -> None:
+        """ Indexes the stale habits again, or all habits on the first call of the day.
+        The streak index is dropped on the first call of the day, and only built again when it is queried.
+
+        :return: the function returns nothing
+        """
+        today = datetime.now().toordinal()
+        if self._index_day != today:
+            self._index_day = today
+            self._indexed = {}
+            self._checked = set()
+            self._names = {periodicity: [] for periodicity in HabitPeriods}
+            self._streaks = None
+            for name, habit_obj in self.habits.items():
+                self.__index(name, habit_obj, today, in_order = False)
+            for periodicity in HabitPeriods:
+                self._names[periodicity].sort()
+        else:
+            for name in self._stale:
+                self.__unindex(name)
+                habit_obj = self.habits.get(name)
+                if habit_obj is not None:
+                    self.__index(name, habit_obj, today)
+        self._stale = set()
+        return
+
+    def __build_streaks(self) -> None:
+        """ Builds the streak index of the indexed habits, if it is not built for today
+
+        :return: the function returns nothing
+        """
+        if self._streaks is not None:
+            return
+        self._streaks = {periodicity: [] for periodicity in HabitPeriods}
+        for name, (periodicity, _) in self._indexed.items():
+            streak = self.__streak(self.habits[name], self._index_day)
+            self._indexed[name] = (periodicity, streak)
+            self._streaks[periodicity].append((-streak, name))
+        for periodicity in HabitPeriods:
+            self._streaks[periodicity].sort()
+        return
+
+    @staticmethod
+    def __streak(habit_obj: Habit, today: int) -> int:
+        """ Calculates the current streak of the habit for the streak index, a lazy history is only decoded from its end
+
+        :param Habit habit_obj: the habit object
+        :param int today: the date of the current streak, as a day ordinal
+        :return: the current streak, 0 if the history is irregular
+        :rtype: int
+        """
+        try:
+            return habit_obj.current_streak(today)
+        except HabitError:
+            return 0
+
+    def __index(self, name: str, habit_obj: Habit, today: int, in_order: bool = True) -> None:
+        """ Adds the habit to the indexes. The streak is only calculated if the streak index is built.
+
+        :param str name: name of the habit
+        :param Habit habit_obj: the habit object
+        :param int today: the date of the current streak, as a day ordinal
+        :param bool in_order: inserts in sorted position, otherwise appends and the lists are sorted afterwards
+        :return: the function returns nothing
+        """
+        periodicity = habit_obj.periodicity
+        streak = None if self._streaks is None else self.__streak(habit_obj, today)
+        self._indexed[name] = (periodicity, streak)
+        if habit_obj.is_checked_off():
+            self._checked.add(name)
+        if in_order:
+            bisect.insort(self._names[periodicity], name)
+            if streak is not None:
+                bisect.insort(self._streaks[periodicity], (-streak, name))
+        else:
+            self._names[periodicity].append(name)
+        return
+
+    def __unindex(self, name: str) -> None:
+        """ Removes the habit from the indexes, if it is indexed
+
+        :param str name: name of the habit
+        :return: the function returns nothing
+        """
+        entry = self._indexed.pop(name, None)
+        if entry is None:
+            return
+        periodicity, streak = entry
+        self._checked.discard(name)
+        names = self._names[periodicity]
+        del names[bisect.bisect_left(names, name)]
+        if streak is not None:
+            streaks = self._streaks[periodicity]
+            del streaks[bisect.bisect_left(streaks, (-streak, name))]
+        return
+
+    def data_as_dict(self) -> MappingProxyType:
+        """ Returns the habit data as a read only mapping of habit names to habit objects, without copying them.
+        The mapping stays as it is when the habits are changed afterwards.
         For usage in Analytics module.
 
-        :return: dictionary of habit objects
-        :rtype: dict
+        :return: read only mapping of habit objects
+        :rtype: MappingProxyType
+        """
+        # a view handed out is never changed, so it is given again without waiting for the locks
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self.__locked(None), self._lock:
+            if self._snapshot is None:
+                self._snapshot = MappingProxyType(self.habits)
+                self._snapshot_habits = self.habits
+            return self._snapshot
+
+    def __copy_on_write(self, name: str | None = None) -> Habit | None:
+        """ Copies the habits dict before it is changed, if data_as_dict handed out a view of it,
+        and copies the named habit if the habit object is shared with the last view
+
+        :param name: name of the habit to be changed, None if only the dict is changed
+        :return: the habit object that can be changed, None if no name is given
         """
-        return self.habits.copy()
+        with self._lock:
+            if self._snapshot is not None:
+                self.habits = dict(self.habits)
+                self._snapshot = None
+            if name is None:
+                return None
+            habit_obj = self.habits[name]
+            if self._snapshot_habits is not None and self._snapshot_habits.get(name) is habit_obj:
+                habit_obj = habit_obj.copy()
+                self.habits[name] = habit_obj
+            return habit_obj
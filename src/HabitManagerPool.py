@@ -0,0 +1,298 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from src.HabitManager import *
+
+
+class PoolStats(NamedTuple):
+    # Counters of a habit manager pool, returned by HabitManagerPool.stats
+
+    hits: int
+    loads: int
+    evictions: int
+    managers: int
+    checkoffs: int
+
+
+class HabitManagerPool:
+    # Least recently used pool of habit managers, one for each database file.
+    # The pool is bounded by the number of managers, and optionally by the number of check offs they hold,
+    # which stands for their memory. The check offs of a manager are counted when it is loaded.
+    # The least recently used managers are flushed and closed to stay within the bounds, and loaded again
+    # when they are asked for.
+    #
+    # A manager is used through lease(), which pins it: a pinned manager is never evicted, and the pool goes over
+    # its bounds until the lease ends. A manager given by get() is not pinned, so it may be closed by another
+    # thread's eviction, and get() is only meant for a pool used by a single thread.
+    #
+    # The pool lock is only held to look up, reserve, insert and remove managers. A manager is loaded, saved and
+    # closed outside of it, so the I/O of one database doesn't hold up the others. The threads asking for
+    # a database while it loads or while it is evicted wait for that, instead of opening a second manager.
+    # An evicted manager that fails to save its changes goes back to the pool. The managers are thread_safe
+    # by default, as they may be evicted and closed by another thread than the one that loaded them.
+
+    def __init__(self, max_managers: int = 64, max_checkoffs: int | None = None, **manager_options) -> None:
+        """ Initializes the habit manager pool
+
+        :param int max_managers: maximum number of loaded habit managers, not counting the leased ones over it
+        :param max_checkoffs: maximum number of check offs of all loaded habit managers, None for no limit
+        :param manager_options: options given to every HabitManager, such as tuning or write_behind,
+            thread_safe is True unless given
+        :return: The function returns nothing
+        """
+        manager_options.setdefault('thread_safe', True)
+        self.max_managers = max_managers
+        self.max_checkoffs = max_checkoffs
+        self.manager_options = manager_options
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.checkoffs = 0
+        self.__managers = OrderedDict()
+        # key -> number of leases of the manager
+        self.__pins = {}
+        # key -> future of the load or of the eviction in progress
+        self.__loading = {}
+        self.__evicting = {}
+        # keys of the managers leased when the pool was closed, closed when their leases end
+        self.__close_on_release = set()
+        self.__lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.__managers)
+
+    def __contains__(self, db_name: str) -> bool:
+        return os.path.abspath(db_name) in self.__managers
+
+    def get(self, db_name: str) -> HabitManager:
+        """ Gives the habit manager of the database file, loading it if it is not in the pool.
+        The manager is not pinned, use lease() when the pool is shared by many threads.
+
+        :param str db_name: the name of the database file
+        :return: the habit manager, with the habits loaded
+        :rtype: HabitManager
+        """
+        return self.__acquire(db_name, pin = False)
+
+    @clib.contextmanager
+    def lease(self, db_name: str):
+        """ Gives the habit manager of the database file, loading it if it is not in the pool.
+        The manager is not evicted until the lease ends.
+
+        :param str db_name: the name of the database file
+        :return: context manager giving the habit manager, with the habits loaded
+        """
+        key = os.path.abspath(db_name)
+        habit_manager = self.__acquire(db_name, pin = True)
+        try:
+            yield habit_manager
+        finally:
+            with self.__lock:
+                evicted = self.__unpin([key])
+            self.__close(evicted)
+
+    def __unpin(self, keys: list) -> list:
+        """ Ends a lease of each of the managers, and removes the managers to be closed. The pool lock must be held.
+
+        :param list keys: the absolute paths of the database files
+        :return: the removed entries, to be closed by __close() outside the pool lock
+        :rtype: list
+        """
+        evicted = []
+        for key in keys:
+            self.__pins[key] -= 1
+            if self.__pins[key] == 0:
+                del self.__pins[key]
+                if key in self.__close_on_release:
+                    self.__close_on_release.discard(key)
+                    evicted.append(self.__remove(key))
+        return evicted + self.__shrink()
+
+    def __acquire(self, db_name: str, pin: bool) -> HabitManager:
+        """ Gives the habit manager of the database file, loading it outside the pool lock if it is not in the pool
+
+        :param str db_name: the name of the database file
+        :param bool pin: pins the manager, for lease()
+        :return: the habit manager, with the habits loaded
+        :rtype: HabitManager
+        """
+        key = os.path.abspath(db_name)
+        while True:
+            with self.__lock:
+                entry = self.__managers.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self.__managers.move_to_end(key)
+                    if pin:
+                        self.__pins[key] = self.__pins.get(key, 0) + 1
+                    return entry[0]
+                waiting = self.__loading.get(key) or self.__evicting.get(key)
+                if waiting is None:
+                    self.loads += 1
+                    future = self.__loading[key] = Future()
+                    break
+            # another thread is loading or evicting the manager, the pool is looked up again once it is done
+            waiting.exception()
+
+        try:
+            habit_manager = self.__load(db_name)
+        except BaseException as e:
+            with self.__lock:
+                del self.__loading[key]
+            future.set_exception(e)
+            raise
+        with self.__lock:
+            del self.__loading[key]
+            checkoffs = sum(habit.checkoff_count() for habit in habit_manager.habits.values())
+            self.__managers[key] = (habit_manager, checkoffs)
+            self.checkoffs += checkoffs
+            if pin:
+                self.__pins[key] = self.__pins.get(key, 0) + 1
+            evicted = self.__shrink()
+        future.set_result(habit_manager)
+        self.__close(evicted)
+        return habit_manager
+
+    def __load(self, db_name: str) -> HabitManager:
+        """ Opens the habit manager of the database file and loads its habits
+
+        :param str db_name: the name of the database file
+        :return: the habit manager, with the habits loaded
+        :rtype: HabitManager
+        """
+        habit_manager = HabitManager(db_name, **self.manager_options)
+        try:
+            habit_manager.load_habits_from_db()
+        except BaseException:
+            habit_manager.close()
+            raise
+        return habit_manager
+
+    def __over_bounds(self) -> bool:
+        """ Checks if the pool holds more managers or check offs than its bounds
+
+        :return: True if the pool is over its bounds
+        :rtype: bool
+        """
+        return (len(self.__managers) > self.max_managers or
+                self.max_checkoffs is not None and self.checkoffs > self.max_checkoffs)
+
+    def __shrink(self) -> list:
+        """ Removes the least recently used managers that are not leased, until the pool is within its bounds.
+        The most recently used manager is always kept. The pool lock must be held.
+
+        :return: the removed entries, to be closed by __close() outside the pool lock
+        :rtype: list
+        """
+        evicted = []
+        for key in list(self.__managers)[:-1]:
+            if not self.__over_bounds():
+                break
+            if key not in self.__pins:
+                evicted.append(self.__remove(key))
+        return evicted
+
+    def __remove(self, key: str) -> tuple:
+        """ Removes the manager from the pool, marking it as evicted until __close() is done with it.
+        The pool lock must be held.
+
+        :param str key: the absolute path of the database file
+        :return: the key, the manager and its check offs
+        :rtype: tuple
+        """
+        habit_manager, checkoffs = self.__managers.pop(key)
+        self.checkoffs -= checkoffs
+        self.evictions += 1
+        self.__evicting[key] = Future()
+        return key, habit_manager, checkoffs
+
+    def __close(self, evicted: list, raise_errors: bool = False) -> None:
+        """ Saves the changes of the removed managers and closes them, outside the pool lock.
+        A manager that fails to save its changes is put back in the pool as the least recently used,
+        and the error is logged, or raised with raise_errors once all the managers are done.
+
+        :param list evicted: the entries given by __remove()
+        :param bool raise_errors: raises the first error instead of logging it
+        :return: The function returns nothing
+        """
+        error = None
+        for key, habit_manager, checkoffs in evicted:
+            try:
+                habit_manager.flush()
+            except sqlite3.Error as e:
+                with self.__lock:
+                    self.__managers[key] = (habit_manager, checkoffs)
+                    self.__managers.move_to_end(key, last = False)
+                    self.checkoffs += checkoffs
+                    self.evictions -= 1
+                if not raise_errors:
+                    logging.error("Evicting " + key + " failed: " + str(e))
+                elif error is None:
+                    error = e
+            else:
+                try:
+                    habit_manager.close()
+                except sqlite3.Error as e:
+                    # the changes are saved, so the manager is gone even if closing failed
+                    logging.error("Closing " + key + " failed: " + str(e))
+            finally:
+                with self.__lock:
+                    self.__evicting.pop(key).set_result(None)
+        if error is not None:
+            raise error
+
+    def evict(self, db_name: str) -> bool:
+        """ Saves the changes of the habit manager of the database file, closes it and removes it from the pool.
+        If saving fails the manager stays in the pool, and the exception is raised.
+
+        :param str db_name: the name of the database file
+        :return: True if the manager was evicted, False if it is not in the pool or it is leased
+        :rtype: bool
+        """
+        key = os.path.abspath(db_name)
+        with self.__lock:
+            if key not in self.__managers or key in self.__pins:
+                return False
+            evicted = [self.__remove(key)]
+        self.__close(evicted, raise_errors = True)
+        return True
+
+    def flush(self) -> int:
+        """ Saves the changes of all managers in the pool. The managers are pinned while they are saved.
+
+        :return: the number of habits saved or deleted
+        :rtype: int
+        """
+        with self.__lock:
+            keys = list(self.__managers)
+            managers = [self.__managers[key][0] for key in keys]
+            for key in keys:
+                self.__pins[key] = self.__pins.get(key, 0) + 1
+        try:
+            return sum(habit_manager.flush() for habit_manager in managers)
+        finally:
+            with self.__lock:
+                evicted = self.__unpin(keys)
+            self.__close(evicted)
+
+    def close(self) -> None:
+        """ Saves the changes of all managers in the pool, and closes them.
+        The leased managers are closed when their leases end.
+        If saving fails the manager stays in the pool, and the exception is raised.
+
+        :return: The function returns nothing
+        """
+        with self.__lock:
+            evicted = [self.__remove(key) for key in list(self.__managers) if key not in self.__pins]
+            self.__close_on_release.update(self.__pins)
+        self.__close(evicted, raise_errors = True)
+
+    def stats(self) -> PoolStats:
+        """ Gives the counters of the pool
+
+        :return: hits, loads, evictions, number of loaded managers and their check offs
+        :rtype: PoolStats
+        """
+        with self.__lock:
+            return PoolStats(self.hits, self.loads, self.evictions, len(self.__managers), self.checkoffs)
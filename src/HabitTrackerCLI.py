@@ -3,6 +3,80 @@ from src.Interface import *
 import os
 import logging
 
+try:
+    from wcwidth import wcswidth
+except ImportError:
+    # without wcwidth, tabulate measures the cells with len as well
+    wcswidth = len
+
+
+class MainMenuCache:
+    # Table of the habits shown in the main menu, kept between the frames of the main loop.
+    # Nothing is rendered while the version of the habit manager and the day stay the same.
+    # Otherwise only the rows of habits with a different object, name or version are rendered again,
+    # and on the first frame of a new day all rows are, as the streaks and check offs depend on the date.
+    # The table is the one tabulate makes with the mixed_grid format, built here from the rendered rows,
+    # so the unchanged rows are not measured and padded by tabulate again.
+
+    HEADER = 'currently tracked Habits'
+
+    def __init__(self) -> None:
+        """ Initializes the empty cache
+
+        :return: The function returns nothing
+        """
+        self.day = None
+        self.version = None
+        self.table = ""
+        self.rendered = 0
+        self.__rows = {}
+
+    def render(self, habit_manager: HabitManager) -> str:
+        """ Renders the table of the habits, reusing the rows of the habits that didn't change
+
+        :param HabitManager habit_manager: the habit manager of the habits
+        :return: the table as a string
+        :rtype: str
+        """
+        today = datetime.now().toordinal()
+        version = habit_manager.version
+        if today == self.day and version == self.version:
+            return self.table
+        if today != self.day:
+            self.__rows = {}
+        rows = {}
+        for name, habit in habit_manager.data_as_dict().items():
+            row = self.__rows.get(name)
+            if row is None or row[0] is not habit or row[1] != habit.version:
+                text = habit_info(habit).strip()
+                row = (habit, habit.version, text, wcswidth(text))
+                self.rendered += 1
+            rows[name] = row
+        self.__rows = rows
+        self.day = today
+        self.version = version
+        self.table = self.__table(list(rows.values()))
+        return self.table
+
+    def __table(self, rows: list) -> str:
+        """ Builds the mixed_grid table of the rendered rows
+
+        :param list rows: rendered rows of the habits
+        :return: the table as a string
+        :rtype: str
+        """
+        widths = [row[3] for row in rows]
+        if not rows or min(widths) < 0:
+            # tabulate handles the empty table, and the control characters wcwidth can't measure
+            return tabulate([[row[2]] for row in rows], headers = [self.HEADER], tablefmt = 'mixed_grid')
+        width = max(max(widths), wcswidth(self.HEADER))
+        heavy = "━" * (width + 2)
+        light = "─" * (width + 2)
+        head = "┍" + heavy + "┑\n│ " + self.HEADER + " " * (width - wcswidth(self.HEADER)) + " │\n┝" + heavy + "┥\n"
+        body = ("\n├" + light + "┤\n").join(
+            ["│ " + text + " " * (width - text_width) + " │" for _, _, text, text_width in rows])
+        return head + body + "\n┕" + heavy + "┙"
+
 
 class HabitTrackerCLI:
 
@@ -10,6 +84,7 @@ class HabitTrackerCLI:
 
         self.loop = True
         self.habit_manager = habit_manager
+        self.menu_cache = MainMenuCache()
 
     @staticmethod
     def clear_screen() -> None:
@@ -38,7 +113,7 @@ class HabitTrackerCLI:
 
         :returns: None
         """
-        menu_list = list_currently_unchecked_habits(list(self.habit_manager.habits.values()))
+        menu_list = self.habit_manager.query(checked = False)
         habits_to_checkoff = qt.checkbox('Please select the Habits you wish to check off! ',
                                          choices = menu_list).ask()
         self.habit_manager.check_off_habits(habits_to_checkoff)
@@ -49,38 +124,23 @@ class HabitTrackerCLI:
 
         :returns: None
         """
-        habit_list: list = list(self.habit_manager.habits.values())
-        habit_sorted = sorted(habit_list, key = lambda x: x.habit_streak()[0], reverse = True)
-
-        habit_daily = list_habit_with_periodicity(habit_sorted, HabitPeriods.DAILY)
-        habit_weekly = list_habit_with_periodicity(habit_sorted, HabitPeriods.WEEKLY)
-        habit_monthly = list_habit_with_periodicity(habit_sorted, HabitPeriods.MONTHLY)
-        habit_yearly = list_habit_with_periodicity(habit_sorted, HabitPeriods.YEARLY)
+        habit_list = self.habit_manager.data_as_dict().values()
+        if is_batch_analytics_available():
+            batch = batch_habit_analytics(habit_list)
+            tables = {periodicity: batch_analytics_table(batch[periodicity]) for periodicity in HabitPeriods}
+        else:
+            tables = habit_analytics_tables(habit_list)
 
         table_style = "mixed_grid"
         headers = ['Name', '\N{Fire}', '\N{sunflower}',
                    '\N{snowflake}', '\N{snowflake}\N{snowflake}', '\N{sparkles}',
                    '\N{alarm clock}']
 
-        if len(habit_daily) > 1:
-            print("\n Habits with Daily Periodicity: " + str(len(habit_daily)) + "\n")
-            table_data = list_habit_analytics_table(self.habit_manager.data_as_dict(), habit_daily)
-            print(tabulate(table_data, headers, tablefmt = table_style))
-
-        if len(habit_weekly) > 1:
-            print("\n Habits with Weekly Periodicity: " + str(len(habit_weekly)) + "\n")
-            table_data = list_habit_analytics_table(self.habit_manager.data_as_dict(), habit_weekly)
-            print(tabulate(table_data, headers, tablefmt = table_style))
-
-        if len(habit_monthly) > 1:
-            print("\n Habits with Monthly Periodicity: " + str(len(habit_monthly)) + "\n")
-            table_data = list_habit_analytics_table(self.habit_manager.data_as_dict(), habit_monthly)
-            print(tabulate(table_data, headers, tablefmt = table_style))
-
-        if len(habit_yearly) > 1:
-            print("\n Habits with Yearly Periodicity: " + str(len(habit_yearly)) + "\n")
-            table_data = list_habit_analytics_table(self.habit_manager.data_as_dict(), habit_yearly)
-            print(tabulate(table_data, headers, tablefmt = table_style))
+        for periodicity, table_data in tables.items():
+            if len(table_data) > 1:
+                print("\n Habits with " + periodicity.value.capitalize() + " Periodicity: " +
+                      str(len(table_data)) + "\n")
+                print(tabulate(table_data, headers, tablefmt = table_style))
 
         print("\nLegend")
         print("\N{Fire} :", "Current Streak")
@@ -131,34 +191,37 @@ class HabitTrackerCLI:
         :returns: None
         """
 
-        while self.loop:
-
-            self.clear_screen()
-            n_tasks: int = len(self.habit_manager.habits)
-            print("Habit Tracker")
-            print(f"\n You are tracking {n_tasks} Habits! Let's do more!")
-            print("\N{Fire} :", "Current Streak", "\N{sunflower} :", "Longest Streak")
-            habit_names = list_currently_tracked_habits(list(self.habit_manager.habits.values()))
-            habit_info_list = list_habit_info(self.habit_manager.data_as_dict(), habit_names)
-            habit_info_table = [[x] for x in habit_info_list]
-            print(tabulate(habit_info_table, headers = ['currently tracked Habits'], tablefmt = 'mixed_grid'))
-
-            menu = {
-                'Add a new Habit': self.__cli_add_habit,
-                'View/Edit Habits': self.__cli_view_edit_habit,
-                'Check off habits!': self.__cli_checkoff_today_habits,
-                'View Analytics!': self.__cli_view_analytics,
-                'Exit': self.__cli_exit
-            }
-
-            option = qt.select("What do you like to do?", choices = list(menu.keys())).ask()
-
-            try:
-                func = menu[option]
-                func()
-                input('Press any key to continue...')
-            except Exception as e:
-                print("\nERROR: Something went wrong!\n", str(e))
-                logging.error("Exception:" + str(e))
+        try:
+            while self.loop:
+
+                # saves the old enough changes of a write behind habit manager, as the user may stay idle at the menu
+                self.habit_manager.flush_if_due()
+                self.clear_screen()
+                n_tasks: int = len(self.habit_manager.habits)
+                print("Habit Tracker")
+                print(f"\n You are tracking {n_tasks} Habits! Let's do more!")
+                print("\N{Fire} :", "Current Streak", "\N{sunflower} :", "Longest Streak")
+                print(self.menu_cache.render(self.habit_manager))
+
+                menu = {
+                    'Add a new Habit': self.__cli_add_habit,
+                    'View/Edit Habits': self.__cli_view_edit_habit,
+                    'Check off habits!': self.__cli_checkoff_today_habits,
+                    'View Analytics!': self.__cli_view_analytics,
+                    'Exit': self.__cli_exit
+                }
+
+                option = qt.select("What do you like to do?", choices = list(menu.keys())).ask()
+
+                try:
+                    func = menu[option]
+                    func()
+                    input('Press any key to continue...')
+                except Exception as e:
+                    print("\nERROR: Something went wrong!\n", str(e))
+                    logging.error("Exception:" + str(e))
+        finally:
+            # saves the unsaved changes of a write behind habit manager, whatever way the loop ends
+            self.habit_manager.flush()
 
         return None
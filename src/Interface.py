@@ -1,7 +1,7 @@
 import questionary as qt
 from src.HabitManager import *
 from tabulate import tabulate
-from src.Analytics import habit_analytics
+from src.Analytics import analytics_cache
 
 
 def ask_habit_name():
@@ -149,7 +149,8 @@ def habit_report_one(habit_name: str, habit_manager: HabitManager):
                "Total Duration", "Periodicity", "Creation date"]
     table_style = "mixed_grid"
     habit = habit_manager.habits[habit_name]
-    analytics_data = habit_analytics(habit)
+    metrics = analytics_cache.habit_metrics(habit)
+    analytics_data = [habit.name, *metrics, habit.periodicity.value, habit.get_creation_date()]
     history_data = [[x, y] for x, y in zip(headers, analytics_data)]
     print("\n Analytics for ", habit_name, "\n")
     print(tabulate(history_data, tablefmt = table_style))
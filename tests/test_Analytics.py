@@ -1,4 +1,6 @@
 import pytest
+import random
+from datetime import timedelta
 from freezegun import freeze_time
 from src.Analytics import *
 
@@ -110,3 +112,217 @@ def test_analyze_habit_breaks(habit_list):
     long_break, total_breaks = analytics_habit_breaks(habit_history, HabitPeriods.DAILY)
     assert long_break == 2
     assert total_breaks == 5
+
+
+def legacy_analyze_streak(h_dates, older, periodicity):
+    """ The recursive streak calculation, as implemented before"""
+    if not h_dates:
+        return 0, 0
+    time_diff = analytics_time_duration(older, h_dates[-1], periodicity)
+    if (len(h_dates)) <= 1:
+        return (2, 2) if time_diff == 1 else (0, 1)
+    current, longest = legacy_analyze_streak(h_dates[0:-1], h_dates[-1], periodicity)
+    if time_diff == 1:
+        return current + 1, max(current + 1, longest)
+    elif time_diff < 0:
+        return 0, 0
+    else:
+        return 1, longest
+
+
+def legacy_analyze_breaks(h_dates, older, periodicity):
+    """ The recursive break calculation, as implemented before"""
+    if not h_dates:
+        return 0, 0
+    time_diff = analytics_time_duration(older, h_dates[-1], periodicity)
+    if (len(h_dates)) <= 1:
+        return (time_diff - 1, 1) if time_diff > 1 else (0, 0)
+    longest, total = legacy_analyze_breaks(h_dates[0:-1], h_dates[-1], periodicity)
+    if time_diff == 1:
+        return longest, total
+    elif time_diff < 0:
+        return 0, 0
+    else:
+        return max(time_diff - 1, longest), total + 1
+
+
+@pytest.mark.parametrize('periodicity', list(HabitPeriods))
+def test_analyze_against_recursion(periodicity):
+    """ Testing the single pass streaks and breaks against the recursive implementation"""
+    rand = random.Random(42)
+    for _ in range(200):
+        day = datetime(2020, 1, 1)
+        h_dates = []
+        for _ in range(rand.randint(1, 40)):
+            # mostly forward steps, with some repeats and some irregular steps back
+            day += timedelta(days = rand.choice([1, 1, 1, 2, 7, 7, 8, 14, 31, 40, 366, 0, -3]))
+            h_dates.append(day)
+        older = day + timedelta(days = rand.choice([0, 1, 7, 31, 365]))
+        assert analyze_streak(h_dates, older, periodicity) == legacy_analyze_streak(h_dates, older, periodicity)
+        assert analyze_breaks(h_dates, older, periodicity) == legacy_analyze_breaks(h_dates, older, periodicity)
+
+
+@pytest.mark.parametrize('n_days', [10000, 100000])
+def test_analyze_long_history(n_days):
+    """ Testing streaks and breaks on histories far longer than the recursion limit"""
+    start = datetime(1700, 1, 1)
+    # checked off every day, except every 100th day
+    h_dates = [start + timedelta(days = x) for x in range(n_days) if x % 100 != 99]
+    older = h_dates[-1] + timedelta(days = 1)
+    assert analyze_streak(h_dates, older, HabitPeriods.DAILY) == (100, 100)
+    assert analyze_breaks(h_dates, older, HabitPeriods.DAILY) == (1, n_days // 100 - 1)
+
+
+@freeze_time("2024-06-13")
+def test_list_many_habits():
+    """ Testing the listing functions on more habits than the recursion limit"""
+    habits = {}
+    for x in range(5000):
+        habit = Habit(f"test{x}", periodicity = list(HabitPeriods)[x % 4], creation_date = "2024-06-01")
+        if x % 2 == 0:
+            habit.check_off()
+        habits[habit.name] = habit
+    habit_list = list(habits.values())
+    names = list_currently_tracked_habits(habit_list)
+    assert len(names) == 5000
+    assert len(list_currently_checked_habits(habit_list)) == 2500
+    assert len(list_currently_unchecked_habits(habit_list)) == 2500
+    assert len(list_habit_with_periodicity(habit_list, HabitPeriods.YEARLY)) == 1250
+    assert len(list_habit_info(habits, names)) == 5000
+    assert list_habit_analytics(habits, names)[-1][0] == "test4999"
+    assert list_habit_analytics_table(habits, names)[0] == ["test0", 1, 1, 1, 0, 1, 13]
+
+
+def random_habits(seed: int, n_habits: int) -> list:
+    """ Creates habits of every periodicity with random histories ending before 2024-06-13"""
+    rand = random.Random(seed)
+    habits = []
+    for x in range(n_habits):
+        periodicity = list(HabitPeriods)[x % 4]
+        day = datetime(1960, 1, 1) + timedelta(days = rand.randint(0, 20000))
+        habit = Habit(f"test{x}", periodicity = periodicity, creation_date = day.strftime('%Y-%m-%d'))
+        dates = []
+        for _ in range(rand.randint(0, 30)):
+            day += timedelta(days = rand.choice([0, 1, 1, 2, 6, 7, 8, 20, 31, 60, 365, 366, 800]))
+            if day >= datetime(2024, 6, 13):
+                break
+            dates.append(day.strftime('%Y-%m-%d'))
+        habit.set_history(','.join(dates))
+        habits.append(habit)
+    return habits
+
+
+@freeze_time("2024-06-13")
+def test_batch_habit_analytics():
+    """ Testing the batch analytics against the metrics of each habit"""
+    pytest.importorskip('numpy')
+    habits = random_habits(7, 400)
+    result = batch_habit_analytics(habits)
+    for periodicity in HabitPeriods:
+        columns = result[periodicity]
+        expected = [habit for habit in habits if habit.periodicity == periodicity]
+        assert columns['name'] == [habit.name for habit in expected]
+        for i, habit in enumerate(expected):
+            batch = tuple(int(columns[field][i]) for field in HabitMetrics._fields)
+            assert batch == tuple(habit.habit_metrics())
+
+
+@freeze_time("2024-06-13")
+def test_habit_analytics_tables():
+    """ Testing the single pass tables against sorting and filtering by periodicity"""
+    habits = random_habits(25, 400)
+    habit_sorted = sorted(habits, key = lambda x: x.habit_metrics().current_streak, reverse = True)
+    habit_data = {habit.name: habit for habit in habits}
+    tables = habit_analytics_tables(habits)
+    batch = batch_habit_analytics(habits) if is_batch_analytics_available() else None
+    for periodicity in HabitPeriods:
+        names = list_habit_with_periodicity(habit_sorted, periodicity)
+        assert tables[periodicity] == list_habit_analytics_table(habit_data, names)
+        if batch is not None:
+            assert tables[periodicity] == batch_analytics_table(batch[periodicity])
+
+
+@freeze_time("2024-06-13")
+def test_batch_habit_analytics_irregular():
+    """ Testing the batch analytics raises on irregular dates, same as the habit"""
+    pytest.importorskip('numpy')
+    habit = Habit('test', creation_date = "2024-05-01", history = "2024-05-03,2024-05-02")
+    with pytest.raises(HabitError):
+        batch_habit_analytics([Habit('test0'), habit])
+
+
+def test_analytics_cache():
+    """ Testing the analytics cache is invalidated by changes and by the next day"""
+    cache = AnalyticsCache()
+    habit = Habit('test', creation_date = "2024-06-01", history = "2024-06-10,2024-06-11")
+    with freeze_time("2024-06-12"):
+        assert cache.habit_metrics(habit).current_streak == 2
+        assert cache.habit_metrics(habit).current_streak == 2
+        assert (cache.hits, cache.misses) == (1, 1)
+        print("\n Testing check off invalidates the cache..")
+        habit.check_off()
+        assert cache.habit_metrics(habit).current_streak == 3
+        assert (cache.hits, cache.misses) == (1, 2)
+        habit.uncheck_habit()
+        assert cache.habit_metrics(habit).current_streak == 2
+        habit.periodicity = HabitPeriods.WEEKLY
+        assert cache.habit_metrics(habit).current_streak == 1
+        assert (cache.hits, cache.misses) == (1, 4)
+    print("\n Testing the next day invalidates the cache..")
+    with freeze_time("2024-06-14"):
+        habit.periodicity = HabitPeriods.DAILY
+        assert cache.habit_metrics(habit).current_streak == 0
+        assert cache.habit_metrics(habit).current_streak == 0
+        assert (cache.hits, cache.misses) == (2, 5)
+    print("\n Testing only the latest metrics of a habit are kept..")
+    assert len(cache) == 1
+    print("\n Testing scans of many habits hit the cache..")
+    habits = random_habits(2, 5000)
+    for _ in range(3):
+        for other in habits:
+            cache.habit_metrics(other, parse_date("2024-06-12"))
+    assert len(cache) == 5001 and (cache.hits, cache.misses) == (10002, 5005)
+
+
+def test_analytics_cache_weak():
+    """ Testing the analytics cache doesn't keep the habits alive"""
+    cache = AnalyticsCache()
+    habits = [Habit(f'test{x}', creation_date = "2024-06-01", history = "2024-06-10") for x in range(3)]
+    refs = [weakref.ref(habit) for habit in habits]
+    today = parse_date("2024-06-12")
+    for habit in habits:
+        cache.habit_metrics(habit, today)
+    assert len(cache) == 3
+    del habit, habits[0]
+    assert refs[0]() is None
+    # the metrics of the collected habit are removed on the next call
+    assert cache.habit_metrics(habits[0], today).current_streak == 0
+    assert len(cache) == 2 and cache.hits == 1
+    habits.clear()
+    cache.habit_metrics(Habit('test'), today)
+    assert len(cache) == 1 and all(ref() is None for ref in refs)
+
+
+def test_analytics_cache_threads():
+    """ Testing the analytics cache can be shared by many threads"""
+    cache = AnalyticsCache()
+    habits = random_habits(1, 32)
+    today = parse_date("2024-06-12")
+    errors = []
+
+    def read(seed: int) -> None:
+        rng = random.Random(seed)
+        try:
+            for _ in range(2000):
+                habit = rng.choice(habits)
+                assert cache.habit_metrics(habit, today) == habit.habit_metrics(today)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target = read, args = (seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(cache) == 32
+    assert cache.hits + cache.misses == 8000
@@ -1,5 +1,7 @@
 import pytest
 import os
+import random
+from datetime import timedelta
 from src.Database import *
 from freezegun import freeze_time
 
@@ -79,3 +81,169 @@ def test_update_habit_history(test_database):
     for habit in habits:
         if habit[0] == 'test1':
             assert habit[1] == '2024-05-30'
+
+
+@freeze_time("2024-05-30")
+def test_habit_database(tmp_path):
+    db_name = str(tmp_path / "test_connection.db")
+    database = HabitDatabase(db_name)
+    database.initialize()
+    habit_obj = Habit('test1')
+    print("\n Testing the module functions with an open database..")
+    add_habit_to_db(database, habit_obj)
+    habit_obj.check_off()
+    update_habit_history(database, habit_obj)
+    assert is_habit_exists(database, 'test1') is True
+    assert database.load_habit_history()[0][1] == '2024-05-30'
+    print("\n Testing the changes are visible from other connections..")
+    assert load_habit_history(db_name)[0][1] == '2024-05-30'
+    database.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        database.is_habit_exists('test1')
+
+
+@freeze_time("2024-05-30")
+def test_checkoff_rows(tmp_path):
+    db_name = str(tmp_path / "test_checkoff.db")
+    initialize_database(db_name)
+    add_habit_to_db(db_name, Habit('test1', history = '2024-05-28'))
+    print("\n Testing single check off rows..")
+    add_checkoff(db_name, 'test1', '2024-05-30')
+    add_checkoff(db_name, 'test1', '2024-05-29')
+    add_checkoff(db_name, 'test1', '2024-05-29')
+    assert load_habit_history(db_name) == [('test1', '2024-05-28,2024-05-29,2024-05-30')]
+    remove_checkoff(db_name, 'test1', '2024-05-30')
+    assert load_habit_history(db_name) == [('test1', '2024-05-28,2024-05-29')]
+    print("\n Testing delete removes the history rows..")
+    delete_habit(db_name, 'test1')
+    with HabitDatabase(db_name) as database:
+        assert database.connection.execute("SELECT COUNT(*) FROM HabitCheckoff").fetchone()[0] == 0
+
+
+def test_history_migration(tmp_path):
+    db_name = str(tmp_path / "test_migration.db")
+    with sqlite3.connect(db_name) as con:
+        con.execute("CREATE TABLE HabitData (habit_name TEXT PRIMARY KEY, descr TEXT, "
+                    "periodicity TEXT, creation_date TEXT)")
+        con.execute("CREATE TABLE HabitHistory (habit_name TEXT, history TEXT)")
+        con.executemany("INSERT INTO HabitData VALUES(?, ?, ?, ?)",
+                        [('test1', '', 'daily', '2024-05-01'), ('test2', '', 'weekly', '2024-05-01')])
+        con.executemany("INSERT INTO HabitHistory VALUES(?, ?)",
+                        [('test1', '2024-05-01,2024-05-02,2024-05-04'), ('test2', '')])
+    con.close()
+    print("\n Testing the migration of the old history table..")
+    initialize_database(db_name)
+    initialize_database(db_name)
+    assert load_habit_history(db_name) == [('test1', '2024-05-01,2024-05-02,2024-05-04'), ('test2', '')]
+    with HabitDatabase(db_name) as database:
+        con = database.connection
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert con.execute("SELECT name FROM sqlite_master WHERE name = 'HabitHistory'").fetchone() is None
+
+
+def test_habit_id_migration(tmp_path):
+    db_name = str(tmp_path / "test_habit_id_migration.db")
+    with sqlite3.connect(db_name) as con:
+        con.execute("CREATE TABLE HabitData (habit_name TEXT PRIMARY KEY, descr TEXT, "
+                    "periodicity TEXT, creation_date TEXT)")
+        con.execute("CREATE TABLE HabitCheckoff (habit_name TEXT NOT NULL, period_date TEXT NOT NULL, "
+                    "PRIMARY KEY (habit_name, period_date)) WITHOUT ROWID")
+        con.executemany("INSERT INTO HabitData VALUES(?, ?, ?, ?)",
+                        [('test1', 'one', 'daily', '2024-05-01'), ('test2', '', 'weekly', '2024-05-01')])
+        con.executemany("INSERT INTO HabitCheckoff VALUES(?, ?)",
+                        [('test1', '2024-05-01'), ('test1', '2024-05-02'), ('test3', '2024-05-02')])
+        con.execute("PRAGMA user_version = 1")
+    con.close()
+    print("\n Testing the migration of the tables keyed by habit name..")
+    initialize_database(db_name)
+    assert load_habit_history(db_name) == [('test1', '2024-05-01,2024-05-02'), ('test2', '')]
+    assert [tuple(row) for row in load_habit_data(db_name)] == [('test1', 'one', 'daily', '2024-05-01'),
+                                                                ('test2', '', 'weekly', '2024-05-01')]
+    print("\n Testing the history follows the habit_id on rename..")
+    rename_habit(db_name, 'test1', 'test3')
+    assert load_habit_history(db_name) == [('test3', '2024-05-01,2024-05-02'), ('test2', '')]
+    with HabitDatabase(db_name) as database:
+        con = database.connection
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert con.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%ByName'").fetchone()[0] == 0
+
+
+def test_database_tuning(tmp_path):
+    db_name = str(tmp_path / "test_tuning.db")
+    print("\n Testing the tuning profile is applied on the connection..")
+    with HabitDatabase(db_name, 'fast') as database:
+        con = database.connection
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert con.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert con.execute("PRAGMA cache_size").fetchone()[0] == -65536
+        assert con.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert con.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    tuning = DatabaseTuning(synchronous = 'off', cache_size = 100)
+    assert tuning.pragmas() == ["PRAGMA synchronous = OFF", "PRAGMA cache_size = 100"]
+    assert TUNING_PROFILES['default'].pragmas() == []
+    with pytest.raises(ValueError):
+        DatabaseTuning(journal_mode = 'WAL; DROP TABLE HabitData').pragmas()
+
+
+@freeze_time("2024-06-13")
+def test_iter_habit_metrics(tmp_path):
+    db_name = str(tmp_path / "test_metrics.db")
+    initialize_database(db_name)
+    rand = random.Random(11)
+    habits = {}
+    for x in range(400):
+        periodicity = list(HabitPeriods)[x % 4]
+        day = datetime(1990, 1, 1) + timedelta(days = rand.randint(0, 12000))
+        habit = Habit(f"test{x:03}", periodicity = periodicity, creation_date = day.strftime('%Y-%m-%d'))
+        dates = []
+        for _ in range(rand.randint(0, 30)):
+            day += timedelta(days = rand.choice([1, 1, 2, 3, 6, 7, 8, 13, 20, 31, 60, 365, 366, 800]))
+            if day >= datetime(2024, 6, 13):
+                break
+            dates.append(day.strftime('%Y-%m-%d'))
+        habit.set_history(','.join(dates))
+        add_habit_to_db(db_name, habit)
+        habits[habit.name] = habit
+    print("\n Testing the SQL metrics against the habit class..")
+    results = list(iter_habit_metrics(db_name))
+    assert [name for name, _ in results] == sorted(habits)
+    for name, metrics in results:
+        habit = habits[name]
+        assert metrics == habit.habit_metrics()
+        assert (metrics.current_streak, metrics.longest_streak) == habit.habit_streak()
+        assert (metrics.longest_break, metrics.total_breaks) == habit.habit_breaks()
+        assert (metrics.total_checkoffs, metrics.total_duration) == habit.habit_stats()
+    print("\n Testing the SQL metrics against a given date..")
+    today = datetime(2030, 1, 1).toordinal()
+    for name, metrics in iter_habit_metrics(db_name, today):
+        assert metrics == habits[name].habit_metrics(today)
+
+
+@freeze_time("2024-06-13")
+def test_iter_habit_metrics_irregular(tmp_path):
+    db_name = str(tmp_path / "test_metrics_irregular.db")
+    initialize_database(db_name)
+    add_habit_to_db(db_name, Habit('test1', creation_date = "2024-06-01"))
+    add_habit_to_db(db_name, Habit('test2', creation_date = "2024-06-01", history = "2024-06-10"))
+    assert [metrics.total_duration for _, metrics in iter_habit_metrics(db_name)] == [0, 13]
+    with pytest.raises(HabitError):
+        list(iter_habit_metrics(db_name, datetime(2024, 6, 5).toordinal()))
+
+
+def test_threaded_readers_closed(tmp_path):
+    db_name = str(tmp_path / "test_threaded_readers.db")
+    database = ThreadedHabitDatabase(db_name)
+    database.initialize()
+    database.add_habit(Habit('test1'))
+    print("\n Testing the reading connections of exited threads are closed..")
+    readers = []
+    for _ in range(50):
+        thread = threading.Thread(target = lambda: readers.append(database.reader()) or database.load_habit_names())
+        thread.start()
+        thread.join()
+    assert len(set(map(id, readers))) == 50 and len(database._readers) == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        readers[0].load_habit_names()
+    assert database.load_habit_names() == {'test1'} and len(database._readers) == 1
+    database.close()
+    assert len(database._readers) == 0
@@ -1,5 +1,8 @@
 import pytest
+import re
+import math
 from freezegun import freeze_time
+from datetime import timedelta
 from src.Habit import *
 
 
@@ -194,3 +197,122 @@ def test_get_creation_date():
     habit_obj2 = Habit('test')
     print("\n Testing creation date without parameter..")
     assert habit_obj2.get_creation_date() == "2024-05-30"
+
+
+@freeze_time("2024-05-30")
+def test_reset_history():
+    """ Testing reset history from Habit class"""
+    history = "2024-05-25,2024-05-26,2024-05-27,2024-05-30"
+    habit_obj = Habit("test", "test",
+                      HabitPeriods.DAILY, "2024-05-27", history)
+    print("\n Testing history is stored as day ordinals..")
+    assert list(habit_obj.habit_history) == [datetime(2024, 5, day).toordinal() for day in [25, 26, 27, 30]]
+    habit_obj.reset_history()
+    print("\n Testing if history is reset..")
+    assert habit_obj.get_history() == ""
+    assert habit_obj.is_checked_off() is False
+
+
+@pytest.mark.parametrize('periodicity', list(HabitPeriods))
+def test_incremental_counters(periodicity: HabitPeriods):
+    """ Testing the counters kept on check off / uncheck against a full scan of the history"""
+    habit_obj = Habit("test", "test", periodicity, "2022-01-01", "2022-01-01")
+    start = datetime(2022, 1, 2)
+    for day in range(0, 730, 4):
+        with freeze_time(start + timedelta(days = day)):
+            if day % 7 != 0:
+                habit_obj.check_off()
+            if day % 5 == 0:
+                habit_obj.uncheck_habit()
+            scanned = Habit("test", "test", periodicity, "2022-01-01", habit_obj.get_history())
+            assert habit_obj.habit_streak() == scanned.habit_streak()
+            assert habit_obj.habit_breaks() == scanned.habit_breaks()
+
+
+@freeze_time("2024-06-13")
+@pytest.mark.parametrize(('history', 'current_streak', 'longest_streak'), data_streak)
+def test_habit_metrics(history: str, current_streak: float, longest_streak: float):
+    """ Tests habit metrics from Habit class against streaks, breaks and stats"""
+    habit_obj = Habit("test", "test",
+                      HabitPeriods.DAILY, "2024-04-15", history)
+    metrics = habit_obj.habit_metrics()
+    print('\nCalculated metrics:', metrics)
+    assert (metrics.current_streak, metrics.longest_streak) == (current_streak, longest_streak)
+    assert (metrics.longest_break, metrics.total_breaks) == habit_obj.habit_breaks()
+    assert (metrics.total_checkoffs, metrics.total_duration) == habit_obj.habit_stats()
+
+
+date_strings = ['2024-05-30', '2024-5-3', '2024-02-29', '2023-02-29', '2024-13-01', '2024-00-10',
+                '0000-01-01', '2024-05-30 ', ' 2024-05-30', '2024-+5-30', '2024/05/30', '', 'test']
+
+
+@pytest.mark.parametrize('day', date_strings)
+def test_parse_date(day: str):
+    """ Testing the date parser against datetime.strptime"""
+    try:
+        expected = datetime.strptime(day, '%Y-%m-%d').toordinal()
+    except ValueError as e:
+        with pytest.raises(ValueError, match = re.escape(str(e))):
+            parse_date(day)
+        return
+    assert parse_date(day) == expected
+
+
+def test_set_history_invalid():
+    """ Testing set history fails on invalid dates and keeps the old history"""
+    habit_obj = Habit("test", history = "2024-05-25,2024-05-26")
+    with pytest.raises(ValueError):
+        habit_obj.set_history("2024-05-25,2024-05-32")
+    assert habit_obj.get_history() == "2024-05-25,2024-05-26"
+
+
+@freeze_time("2024-06-13")
+@pytest.mark.parametrize(('periodicity', 'history'),
+                         [(HabitPeriods.DAILY, x[0]) for x in data_streak[:-1]] +
+                         [(HabitPeriods.WEEKLY, x[0]) for x in streak_weekly[:-1]] +
+                         [(HabitPeriods.MONTHLY, x[0]) for x in streak_monthly[:-1]] +
+                         [(HabitPeriods.YEARLY, x[0]) for x in streak_yearly[:-1]])
+def test_lazy_history(periodicity: HabitPeriods, history: str):
+    """ Testing a lazily loaded history against an eagerly loaded one"""
+    eager = Habit("test", "test", periodicity, "2015-05-15", history)
+    lazy = Habit("test", "test", periodicity, "2015-05-15")
+    lazy.set_history(history, lazy = True)
+    print("\n Testing the recent state without decoding..")
+    assert lazy.is_checked_off() == eager.is_checked_off()
+    assert lazy.current_streak() == eager.habit_streak()[0]
+    assert lazy.habit_stats() == eager.habit_stats()
+    assert lazy.check_off() == eager.check_off()
+    assert lazy.get_history() == eager.get_history()
+    assert lazy.uncheck_habit() == eager.uncheck_habit()
+    assert lazy.get_history() == eager.get_history()
+    print("\n Testing the full analytics..")
+    assert lazy.habit_metrics() == eager.habit_metrics()
+    assert lazy.habit_history == eager.habit_history
+
+
+def legacy_duration(recent_date: datetime, older_date: datetime, periodicity: HabitPeriods) -> int:
+    """ The duration between two dates as calculated before the period indexes"""
+    if periodicity == HabitPeriods.DAILY:
+        return (recent_date - older_date).days
+    elif periodicity == HabitPeriods.WEEKLY:
+        days_inbetween = (recent_date - older_date).days
+        r = ((recent_date.weekday() + 1) % 7) + 1
+        o = ((older_date.weekday() + 1) % 7) + 1
+        return 0 if days_inbetween < 7 else math.ceil((days_inbetween - (r - 1) - (7 - o)) / 7)
+    elif periodicity == HabitPeriods.MONTHLY:
+        return (recent_date.year - older_date.year) * 12 + recent_date.month - older_date.month
+    return recent_date.year - older_date.year
+
+
+@pytest.mark.parametrize('periodicity', list(HabitPeriods))
+def test_period_duration(periodicity: HabitPeriods):
+    """ Testing the period indexes against the previous duration calculation"""
+    start = datetime(2023, 12, 20)
+    days = [start + timedelta(days = x) for x in range(-20, 420, 3)]
+    for older in days[:30]:
+        for recent in days:
+            expected = legacy_duration(recent, older, periodicity)
+            assert period_duration(recent.toordinal(), older.toordinal(), periodicity) == expected
+    ordinals = [day.toordinal() for day in days]
+    assert period_durations(ordinals, periodicity) == [period_duration(recent, older, periodicity)
+                                                       for recent, older in zip(ordinals[1:], ordinals)]
@@ -1,5 +1,9 @@
 import pytest
 import os
+import sys
+import random
+import threading
+from datetime import timedelta
 from src.HabitManager import *
 from src.Analytics import *
 from freezegun import freeze_time
@@ -73,6 +77,24 @@ def test_edit_habit_periodicity(db_habit):
     assert habit_manager.habits['test1'].periodicity == HabitPeriods.YEARLY
 
 
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_edit_habit_periodicity_resets_database(tmp_path, write_behind):
+    db_name = str(tmp_path / "test_periodicity.db")
+    habit_manager = HabitManager(db_name, write_behind = write_behind)
+    habit_manager.add_habit('test1', history = '2024-05-28,2024-05-29')
+    habit_manager.add_habit('test2', history = '2024-05-29')
+    habit_manager.flush()
+    print("\n Testing the periodicity change resets the history in the database..")
+    habit_manager.edit_habit_periodicity('test1', HabitPeriods.WEEKLY)
+    habit_manager.close()
+    assert load_habit_history(db_name) == [('test1', ''), ('test2', '2024-05-29')]
+    habit_manager = HabitManager(db_name)
+    habit_manager.load_habits_from_db()
+    assert habit_manager.habits['test1'].periodicity == HabitPeriods.WEEKLY
+    assert habit_manager.habits['test1'].get_history() == ""
+    habit_manager.close()
+
+
 def test_edit_habit_desc(db_habit):
     habit_manager = HabitManager(db_habit)
     habit_manager.load_habits_from_db()
@@ -110,3 +132,433 @@ def test_reset_habit(db_habit):
     assert habit_manager.habits['test1'].get_history() == "2024-05-30"
     habit_manager.edit_habit_reset('test1')
     assert habit_manager.habits['test1'].get_history() == ""
+
+
+@freeze_time("2024-05-30")
+def test_check_off_habits_outcomes(tmp_path):
+    habit_manager = HabitManager(str(tmp_path / "test_check_off.db"))
+    habit_manager.add_habit('test1')
+    habit_manager.add_habit('test2', history = '2024-05-30')
+    print("\n Testing check off outcomes..")
+    outcomes = habit_manager.check_off_habits(['test1', 'test2', 'test3'])
+    assert outcomes == {'test1': CheckOffOutcome.CHECKED_OFF,
+                        'test2': CheckOffOutcome.ALREADY_CHECKED_OFF,
+                        'test3': CheckOffOutcome.NOT_FOUND}
+    assert habit_manager.check_off_habits([]) == {}
+    assert load_habit_history(habit_manager.database) == [('test1', '2024-05-30'), ('test2', '2024-05-30')]
+    print("\n Testing a repeated habit keeps its first outcome..")
+    habit_manager.add_habit('test4')
+    outcomes = habit_manager.check_off_habits(['test4', 'test3', 'test4'])
+    assert outcomes == {'test4': CheckOffOutcome.CHECKED_OFF, 'test3': CheckOffOutcome.NOT_FOUND}
+    assert habit_manager.habits['test4'].checkoff_count() == 1
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_check_off_habits_rollback(tmp_path):
+    habit_manager = HabitManager(str(tmp_path / "test_rollback.db"))
+    habit_manager.add_habit('test1')
+    habit_manager.add_habit('test2', history = '2024-05-28,2024-05-29')
+    habit_manager.close()
+    print("\n Testing check offs are undone when saving fails..")
+    with pytest.raises(sqlite3.Error):
+        habit_manager.check_off_habits(['test1', 'test2'])
+    assert habit_manager.habits['test1'].get_history() == ""
+    assert habit_manager.habits['test2'].get_history() == "2024-05-28,2024-05-29"
+    assert habit_manager.habits['test2'].habit_streak() == (2, 2)
+
+
+def test_load_habits_progress(tmp_path):
+    db_name = str(tmp_path / "test_progress.db")
+    initialize_database(db_name)
+    for x in range(25):
+        add_habit_to_db(db_name, Habit(f"test{x:02}", periodicity = list(HabitPeriods)[x % 4],
+                                       creation_date = '2024-01-01', history = '2024-01-01,2024-02-02' * (x % 2)))
+    habit_manager = HabitManager(db_name)
+    loaded = []
+    print("\n Testing the progress of loading the habits..")
+    habit_manager.load_habits_from_db(progress = loaded.append, chunk_size = 10)
+    assert loaded == [10, 20, 25]
+    assert len(habit_manager.habits) == 25
+    for name, history in load_habit_history(db_name):
+        habit = habit_manager.habits[name]
+        assert habit.get_history() == history
+        assert habit.periodicity == list(HabitPeriods)[int(name[4:]) % 4]
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_write_behind(tmp_path):
+    db_name = str(tmp_path / "test_write_behind.db")
+    habit_manager = HabitManager(db_name, write_behind = True, flush_count = 5, flush_age = 60)
+    habit_manager.add_habit('test1')
+    habit_manager.add_habit('test2', history = '2024-05-28,2024-05-29')
+    habit_manager.check_off_habits(['test1', 'test2'])
+    habit_manager.edit_habit_description('test2', 'testy')
+    habit_manager.edit_habit_name('test1', 'test3')
+    print("\n Testing the changes are not saved before a flush..")
+    assert load_habit_data(db_name) == []
+    assert habit_manager.flush() == 2
+    assert habit_manager.flush() == 0
+    assert load_habit_history(db_name) == [('test2', '2024-05-28,2024-05-29,2024-05-30'), ('test3', '2024-05-30')]
+    assert {data[0]: data[1] for data in load_habit_data(db_name)} == {'test2': 'testy', 'test3': ''}
+    print("\n Testing deletes and unchecks are saved by the flush..")
+    habit_manager.uncheck_habit('test2')
+    habit_manager.delete_habit('test3')
+    habit_manager.flush()
+    assert load_habit_history(db_name) == [('test2', '2024-05-28,2024-05-29')]
+    print("\n Testing the count threshold..")
+    for x in range(4):
+        habit_manager.add_habit(f"count{x}")
+    assert len(load_habit_data(db_name)) == 1
+    habit_manager.add_habit("count4")
+    assert len(load_habit_data(db_name)) == 6
+    print("\n Testing close saves the changes..")
+    habit_manager.edit_habit_reset('test2')
+    habit_manager.close()
+    # the habits are loaded in the order they were added
+    assert load_habit_history(db_name) == [('test2', '')] + [(f"count{x}", '') for x in range(5)]
+
+
+def test_write_behind_age(tmp_path):
+    db_name = str(tmp_path / "test_write_behind_age.db")
+    with freeze_time("2024-05-30 10:00:00") as frozen:
+        habit_manager = HabitManager(db_name, write_behind = True, flush_count = 100, flush_age = 5)
+        habit_manager.add_habit('test1')
+        frozen.tick(3)
+        habit_manager.add_habit('test2')
+        assert load_habit_data(db_name) == []
+        print("\n Testing the age threshold..")
+        frozen.tick(3)
+        habit_manager.check_off_habits(['test1'])
+        assert len(load_habit_data(db_name)) == 2
+        assert load_habit_history(db_name)[0] == ('test1', '2024-05-30')
+        print("\n Testing the age is checked without a change..")
+        habit_manager.uncheck_habit('test1')
+        frozen.tick(3)
+        assert habit_manager.flush_if_due() == 0
+        frozen.tick(3)
+        assert habit_manager.flush_if_due() == 1
+        assert load_habit_history(db_name)[0] == ('test1', '')
+        assert habit_manager.flush_if_due() == 0
+        habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_write_behind_checkoffs(tmp_path):
+    db_name = str(tmp_path / "test_write_behind_checkoffs.db")
+    history = ','.join(date.fromordinal(date(2024, 5, 29).toordinal() - day).isoformat() for day in range(999, -1, -1))
+    habit_manager = HabitManager(db_name, write_behind = True)
+    habit_manager.add_habit('test1', history = history)
+    habit_manager.add_habit('test2', history = '2024-05-28')
+    habit_manager.flush()
+    statements = []
+    habit_manager.database.connection.set_trace_callback(statements.append)
+    print("\n Testing a check off is saved as a single row..")
+    habit_manager.check_off_habits(['test1', 'test2'])
+    habit_manager.uncheck_habit('test2')
+    assert habit_manager.flush() == 2
+    checkoff_statements = [statement for statement in statements if 'HabitCheckoff' in statement]
+    assert len(checkoff_statements) == 2
+    assert load_habit_history(db_name) == [('test1', history + ',2024-05-30'), ('test2', '2024-05-28')]
+    print("\n Testing a reset still writes the whole history..")
+    habit_manager.uncheck_habit('test1')
+    habit_manager.edit_habit_reset('test1')
+    habit_manager.check_off_habits(['test1'])
+    habit_manager.edit_habit_name('test2', 'test3')
+    habit_manager.check_off_habits(['test3'])
+    habit_manager.close()
+    assert load_habit_history(db_name) == [('test1', '2024-05-30'), ('test3', '2024-05-28,2024-05-30')]
+
+
+@freeze_time("2024-05-30")
+def test_write_behind_failed_flush(tmp_path):
+    db_name = str(tmp_path / "test_write_behind_failed.db")
+    habit_manager = HabitManager(db_name, write_behind = True)
+    habit_manager.add_habit('test1')
+    habit_manager.add_habit('test2')
+    habit_manager.flush()
+    habit_manager.check_off_habits(['test1', 'test2'])
+    habit_manager.delete_habit('test1')
+    habit_manager.database.connection.execute(
+        "CREATE TRIGGER fail BEFORE INSERT ON HabitCheckoff "
+        "WHEN NEW.habit_id = (SELECT habit_id FROM HabitData WHERE habit_name = 'test2') "
+        "BEGIN SELECT RAISE(ABORT, 'failed'); END")
+    print("\n Testing a failed flush leaves the database as it was..")
+    with pytest.raises(sqlite3.Error):
+        habit_manager.flush()
+    assert load_habit_history(db_name) == [('test1', ''), ('test2', '')]
+    print("\n Testing the habits stay dirty for the next flush..")
+    habit_manager.database.connection.execute("DROP TRIGGER fail")
+    assert habit_manager.flush() == 2
+    assert load_habit_history(db_name) == [('test2', '2024-05-30')]
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_reconcile(tmp_path, caplog):
+    db_name = str(tmp_path / "test_reconcile.db")
+    habit_manager = HabitManager(db_name, consistency_check = True)
+    habit_manager.add_habit('test1')
+    habit_manager.add_habit('test2')
+    statements = []
+    habit_manager.database.connection.set_trace_callback(statements.append)
+    print("\n Testing the existence check doesn't query the database..")
+    assert habit_manager.is_habit_exist('test1') is True
+    assert habit_manager.is_habit_exist('test3') is False
+    assert statements == []
+    habit_manager.edit_habit_description('test1', 'testy')
+    assert len([x for x in statements if x.startswith('UPDATE')]) == 1
+    assert not any(x.startswith('SELECT') for x in statements)
+    print("\n Testing the reconciliation finds changes made by others..")
+    assert habit_manager.reconcile() == Reconciliation([], [])
+    delete_habit(db_name, 'test2')
+    add_habit_to_db(db_name, Habit('test3'))
+    with caplog.at_level(logging.ERROR):
+        assert habit_manager.reconcile() == Reconciliation(['test2'], ['test3'])
+    assert "test3" in caplog.text
+    habit_manager.load_habits_from_db()
+    assert habit_manager.reconcile() == Reconciliation([], [])
+    habit_manager.write_behind = True
+    habit_manager.add_habit('test4')
+    habit_manager.delete_habit('test3')
+    assert habit_manager.reconcile() == Reconciliation([], [])
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_edit_habit_name_in_place(tmp_path):
+    db_name = str(tmp_path / "test_rename.db")
+    habit_manager = HabitManager(db_name)
+    habit_manager.add_habit('test1', history = ','.join(date.fromordinal(738000 + x).isoformat() for x in range(1000)))
+    habit_manager.add_habit('test2')
+    habit_obj = habit_manager.habits['test1']
+    habit_id = habit_manager.database.connection.execute(
+        "SELECT habit_id FROM HabitData WHERE habit_name = 'test1'").fetchone()[0]
+    statements = []
+    habit_manager.database.connection.set_trace_callback(statements.append)
+    print("\n Testing the rename is a single update of the same habit..")
+    assert habit_manager.edit_habit_name('test1', 'test3') is True
+    assert [x for x in statements if not x.startswith(('BEGIN', 'COMMIT'))] == [
+        "UPDATE HabitData SET habit_name = 'test3' WHERE habit_name == 'test1'"]
+    assert habit_manager.habits['test3'] is habit_obj and habit_obj.name == 'test3'
+    assert 'test1' not in habit_manager.habits
+    assert habit_manager.database.connection.execute(
+        "SELECT habit_id FROM HabitData WHERE habit_name = 'test3'").fetchone()[0] == habit_id
+    assert dict(load_habit_history(db_name))['test3'] == habit_obj.get_history()
+    print("\n Testing a rename to an existing name fails..")
+    assert habit_manager.edit_habit_name('test3', 'test2') is False
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_edit_habit_name_write_behind(tmp_path):
+    db_name = str(tmp_path / "test_rename_write_behind.db")
+    habit_manager = HabitManager(db_name, write_behind = True)
+    habit_manager.add_habit('test1', history = '2024-05-28')
+    habit_manager.add_habit('test2', history = '2024-05-29')
+    habit_manager.add_habit('test3')
+    habit_manager.flush()
+    ids = {row[1]: row[0] for row in habit_manager.database.connection.execute("SELECT * FROM HabitData")}
+    print("\n Testing swapped names and reused names are saved by the flush..")
+    habit_manager.edit_habit_name('test1', 'tmp')
+    habit_manager.edit_habit_name('test2', 'test1')
+    habit_manager.edit_habit_name('tmp', 'test2')
+    habit_manager.delete_habit('test3')
+    habit_manager.edit_habit_name('test2', 'test3')
+    habit_manager.add_habit('test2', history = '2024-05-30')
+    assert habit_manager.reconcile() == Reconciliation([], [])
+    habit_manager.flush()
+    assert load_habit_history(db_name) == [('test3', '2024-05-28'), ('test1', '2024-05-29'), ('test2', '2024-05-30')]
+    renamed_ids = {row[1]: row[0] for row in habit_manager.database.connection.execute("SELECT * FROM HabitData")}
+    assert (renamed_ids['test1'], renamed_ids['test3']) == (ids['test2'], ids['test1'])
+    print("\n Testing a renamed habit is deleted by its name in the database..")
+    habit_manager.edit_habit_name('test3', 'test4')
+    habit_manager.delete_habit('test4')
+    habit_manager.flush()
+    assert load_habit_history(db_name) == [('test1', '2024-05-29'), ('test2', '2024-05-30')]
+    habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_data_as_dict_snapshot(tmp_path):
+    db_name = str(tmp_path / "test_snapshot.db")
+    habit_manager = HabitManager(db_name)
+    habit_manager.add_habit('test1', history = '2024-05-28,2024-05-29')
+    habit_manager.add_habit('test2')
+    habit_manager.add_habit('test3')
+    print("\n Testing the snapshot is handed out without copying..")
+    snapshot = habit_manager.data_as_dict()
+    assert habit_manager.data_as_dict() is snapshot
+    with pytest.raises(TypeError):
+        snapshot['test4'] = Habit('test4')
+    print("\n Testing the snapshot keeps the state it was taken at..")
+    habit_manager.check_off_habits(['test1'])
+    habit_manager.edit_habit_description('test2', 'testy')
+    habit_manager.edit_habit_name('test3', 'test5')
+    habit_manager.add_habit('test4')
+    assert list(snapshot) == ['test1', 'test2', 'test3']
+    assert snapshot['test1'].get_history() == '2024-05-28,2024-05-29'
+    assert snapshot['test2'].description == "" and snapshot['test3'].name == 'test3'
+    assert habit_manager.habits['test1'].get_history() == '2024-05-28,2024-05-29,2024-05-30'
+    assert habit_manager.habits['test2'].description == 'testy'
+    new_snapshot = habit_manager.data_as_dict()
+    assert new_snapshot is not snapshot and list(new_snapshot) == ['test1', 'test2', 'test5', 'test4']
+    print("\n Testing habits changed after a copy are not copied again..")
+    habit_obj = habit_manager.habits['test1']
+    habit_manager.uncheck_habit('test1')
+    assert new_snapshot['test1'].get_history() == '2024-05-28,2024-05-29,2024-05-30'
+    habit_manager.edit_habit_reset('test1')
+    assert habit_manager.habits['test1'] is not habit_obj
+    assert habit_manager.habits['test1'] is habit_manager.habits['test1']
+    assert new_snapshot['test1'].get_history() == '2024-05-28,2024-05-29,2024-05-30'
+    habit_manager.close()
+
+
+def test_data_as_dict_snapshot_threads(tmp_path):
+    db_name = str(tmp_path / "test_snapshot_threads.db")
+    habit_manager = HabitManager(db_name, write_behind = True, flush_count = 10 ** 6, thread_safe = True)
+    names = [f"test{x}" for x in range(200)]
+    for name in names:
+        habit_manager.add_habit(name)
+    done = threading.Event()
+
+    def writer():
+        while not done.is_set():
+            habit_manager.check_off_habits(names)
+            for name in names:
+                habit_manager.uncheck_habit(name)
+
+    print("\n Testing snapshots don't change while another thread changes the habits..")
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target = writer)
+    thread.start()
+    try:
+        for _ in range(200):
+            snapshot = habit_manager.data_as_dict()
+            state = [habit.get_history() for habit in snapshot.values()]
+            assert [habit.get_history() for habit in snapshot.values()] == state
+    finally:
+        done.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    habit_manager.close()
+
+
+def brute_force_query(habit_manager, periodicity = None, checked = None, order_by = 'name'):
+    habits = [habit for habit in habit_manager.habits.values()
+              if (periodicity is None or habit.periodicity == periodicity)
+              and (checked is None or habit.is_checked_off() == checked)]
+    if order_by == 'streak':
+        habits.sort(key = lambda habit: (-habit.habit_metrics().current_streak, habit.name))
+    else:
+        habits.sort(key = lambda habit: habit.name)
+    return [habit.name for habit in habits]
+
+
+def test_query(tmp_path):
+    db_name = str(tmp_path / "test_query.db")
+    with freeze_time("2024-05-30") as frozen:
+        random.seed(22)
+        habit_manager = HabitManager(db_name, write_behind = True)
+        for x in range(40):
+            habit_manager.add_habit(f"test{x}", periodicity = random.choice(list(HabitPeriods)),
+                                    history = ','.join(date.fromordinal(739000 + day).isoformat()
+                                                       for day in range(random.randrange(10), 30)))
+        print("\n Testing the query matches a scan of the habits after random changes..")
+        for step in range(300):
+            name = f"test{random.randrange(45)}"
+            action = random.randrange(7)
+            if action == 0:
+                habit_manager.check_off_habits([name])
+            elif action == 1:
+                habit_manager.uncheck_habit(name)
+            elif action == 2:
+                habit_manager.edit_habit_periodicity(name, random.choice(list(HabitPeriods)))
+            elif action == 3:
+                habit_manager.edit_habit_name(name, f"test{random.randrange(45)}")
+            elif action == 4:
+                habit_manager.delete_habit(name)
+            elif action == 5:
+                habit_manager.add_habit(name, periodicity = random.choice(list(HabitPeriods)))
+            else:
+                # the streaks and check offs of the next day come from a full rebuild
+                frozen.tick(timedelta(days = 1))
+            periodicity = random.choice([None] + list(HabitPeriods))
+            checked = random.choice([None, True, False])
+            order_by = random.choice(['name', 'streak'])
+            expected = brute_force_query(habit_manager, periodicity, checked, order_by)
+            assert habit_manager.query(periodicity, checked, order_by) == expected
+            assert habit_manager.query(periodicity, checked, order_by, limit = 3, offset = 2) == expected[2:5]
+        with pytest.raises(ValueError):
+            habit_manager.query(order_by = 'description')
+        habit_manager.close()
+
+
+@freeze_time("2024-05-30")
+def test_query_lazy_history(tmp_path):
+    db_name = str(tmp_path / "test_query_lazy.db")
+    habit_manager = HabitManager(db_name)
+    habit_manager.add_habit('test1', history = '2024-05-20,2024-05-28,2024-05-29')
+    habit_manager.add_habit('test2', history = '2024-05-30')
+    habit_manager.add_habit('test3')
+    habit_manager.load_habits_from_db()
+    print("\n Testing the query doesn't decode the lazy histories..")
+    assert habit_manager.query(checked = False) == ['test1', 'test3']
+    assert habit_manager.query(order_by = 'streak') == ['test1', 'test2', 'test3']
+    assert all(habit_manager.habits[name]._raw_history is not None for name in ('test1', 'test2'))
+    habit_manager.close()
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_thread_safe_stress(tmp_path, write_behind):
+    db_name = str(tmp_path / "test_stress.db")
+    habit_manager = HabitManager(db_name, thread_safe = True, write_behind = write_behind, flush_count = 7)
+    shared = [f"shared{x}" for x in range(10)]
+    for name in shared:
+        habit_manager.add_habit(name, history = '2024-01-01,2024-01-02')
+    errors = []
+
+    def worker(n: int) -> None:
+        rand = random.Random(n)
+        try:
+            for i in range(150):
+                names = rand.sample(shared, 3)
+                if rand.random() < 0.5:
+                    habit_manager.check_off_habits(names)
+                else:
+                    habit_manager.uncheck_habit(names[0])
+                own = f"own{n}-{i % 5}"
+                if not habit_manager.add_habit(own):
+                    habit_manager.edit_habit_name(own, own + 'x')
+                    habit_manager.delete_habit(own + 'x')
+                habit_manager.is_habit_exist(names[1])
+                assert habit_manager.database.load_habit_names()
+        except Exception as e:
+            errors.append(e)
+
+    print("\n Testing many threads changing the same habits..")
+    threads = [threading.Thread(target = worker, args = (n,)) for n in range(8)]
+    # switching threads as often as possible, so the races show up
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    habit_manager.flush()
+    expected = {name: habit.get_history() for name, habit in habit_manager.habits.items()}
+    assert dict(load_habit_history(db_name)) == expected
+    habit_manager.close()
+    print("\n Testing the history is consistent after reloading..")
+    habit_manager = HabitManager(db_name)
+    habit_manager.load_habits_from_db()
+    assert {name: habit.get_history() for name, habit in habit_manager.habits.items()} == expected
+    for name in shared:
+        habit_manager.habits[name].habit_metrics()
+    habit_manager.close()
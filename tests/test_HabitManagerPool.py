@@ -0,0 +1,179 @@
+import pytest
+from src.HabitManagerPool import *
+
+
+def make_tenant(tmp_path, name: str, n_habits: int, checked: bool = True) -> str:
+    db_name = str(tmp_path / f"{name}.db")
+    habit_manager = HabitManager(db_name)
+    for x in range(n_habits):
+        habit_manager.add_habit(f"habit {x}")
+    if checked:
+        habit_manager.check_off_habits(list(habit_manager.habits))
+    habit_manager.close()
+    return db_name
+
+
+def test_pool_lru(tmp_path):
+    print("\n Testing the least recently used manager is evicted")
+    tenants = [make_tenant(tmp_path, f"tenant{x}", 1) for x in range(3)]
+    pool = HabitManagerPool(max_managers = 2)
+    first = pool.get(tenants[0])
+    assert pool.get(tenants[0]) is first
+    pool.get(tenants[1])
+    # tenant 0 was used last, so tenant 1 is evicted
+    pool.get(tenants[0])
+    pool.get(tenants[2])
+    assert len(pool) == 2
+    assert tenants[0] in pool and tenants[1] not in pool
+    assert pool.stats() == PoolStats(hits = 2, loads = 3, evictions = 1, managers = 2, checkoffs = 2)
+    # an evicted manager is loaded again
+    assert pool.get(tenants[1]) is not None
+    assert tenants[0] not in pool
+    assert (pool.loads, pool.evictions) == (4, 2)
+    pool.close()
+    assert len(pool) == 0 and pool.checkoffs == 0
+
+
+def test_pool_checkoff_budget(tmp_path):
+    print("\n Testing the pool stays within its check off budget")
+    small = [make_tenant(tmp_path, f"small{x}", 2) for x in range(3)]
+    large = make_tenant(tmp_path, "large", 5)
+    pool = HabitManagerPool(max_checkoffs = 6)
+    for db_name in small:
+        pool.get(db_name)
+    assert pool.checkoffs == 6 and len(pool) == 3
+    pool.get(large)
+    assert pool.checkoffs == 5 and len(pool) == 1
+    # a manager over the budget on its own is still kept
+    pool.max_checkoffs = 1
+    assert pool.get(large) is pool.get(large)
+    pool.close()
+
+
+def test_pool_evict_flushes(tmp_path):
+    print("\n Testing evicted write behind managers save their changes")
+    tenants = [make_tenant(tmp_path, f"tenant{x}", 1, checked = False) for x in range(2)]
+    pool = HabitManagerPool(max_managers = 1, write_behind = True, flush_count = 100)
+    pool.get(tenants[0]).check_off_habits(['habit 0'])
+    assert load_habit_history(tenants[0]) == [('habit 0', '')]
+    pool.get(tenants[1])
+    assert load_habit_history(tenants[0])[0][1] != ''
+    assert pool.get(tenants[0]).habits['habit 0'].checkoff_count() == 1
+    assert pool.evict(tenants[0]) and not pool.evict(tenants[0])
+    pool.close()
+
+
+def test_pool_evict_other_thread(tmp_path):
+    print("\n Testing a manager loaded in another thread is evicted and saved")
+    tenants = [make_tenant(tmp_path, f"tenant{x}", 1, checked = False) for x in range(2)]
+    pool = HabitManagerPool(max_managers = 1, write_behind = True, flush_count = 100)
+    thread = threading.Thread(target = lambda: pool.get(tenants[0]).check_off_habits(['habit 0']))
+    thread.start()
+    thread.join()
+    pool.get(tenants[1])
+    assert tenants[0] not in pool
+    assert load_habit_history(tenants[0])[0][1] != ''
+    pool.close()
+
+
+def test_pool_evict_failed_flush(tmp_path):
+    print("\n Testing a manager that fails to save its changes stays in the pool")
+    tenant = make_tenant(tmp_path, "tenant", 1, checked = False)
+    pool = HabitManagerPool(write_behind = True, flush_count = 100)
+    pool.get(tenant).check_off_habits(['habit 0'])
+    connection = sqlite3.connect(tenant)
+    connection.execute("CREATE TRIGGER fail BEFORE INSERT ON HabitCheckoff BEGIN SELECT RAISE(ABORT, 'failed'); END")
+    connection.commit()
+    with pytest.raises(sqlite3.Error):
+        pool.evict(tenant)
+    assert tenant in pool and pool.stats().evictions == 0
+    assert load_habit_history(tenant) == [('habit 0', '')]
+    connection.execute("DROP TRIGGER fail")
+    connection.commit()
+    connection.close()
+    assert pool.evict(tenant)
+    assert load_habit_history(tenant)[0][1] != ''
+    pool.close()
+
+
+def test_pool_load_outside_lock(tmp_path, monkeypatch):
+    print("\n Testing a slow load doesn't hold up the other databases, and is only done once")
+    slow, fast = make_tenant(tmp_path, "slow", 1), make_tenant(tmp_path, "fast", 1)
+    started, release = threading.Event(), threading.Event()
+    load_habits_from_db = HabitManager.load_habits_from_db
+
+    def load(habit_manager):
+        if habit_manager.database.db_name == slow:
+            started.set()
+            assert release.wait(10)
+        return load_habits_from_db(habit_manager)
+
+    monkeypatch.setattr(HabitManager, 'load_habits_from_db', load)
+    pool = HabitManagerPool()
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(pool.get(slow))) for _ in range(2)]
+    threads[0].start()
+    assert started.wait(10)
+    threads[1].start()
+    # the other database is loaded while the slow one is still loading
+    assert pool.get(fast).habits.keys() == {'habit 0'}
+    assert slow not in pool
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results[0] is results[1] is pool.get(slow)
+    assert pool.loads == 2
+    pool.close()
+
+
+def test_pool_lease(tmp_path):
+    print("\n Testing a leased manager is not evicted until the lease ends")
+    tenants = [make_tenant(tmp_path, f"tenant{x}", 1, checked = False) for x in range(2)]
+    pool = HabitManagerPool(max_managers = 1, write_behind = True, flush_count = 100)
+    with pool.lease(tenants[0]) as habit_manager:
+        with pool.lease(tenants[0]) as same:
+            assert same is habit_manager
+        pool.get(tenants[1])
+        assert len(pool) == 2 and not pool.evict(tenants[0])
+        habit_manager.check_off_habits(['habit 0'])
+    assert tenants[0] not in pool and tenants[1] in pool
+    assert load_habit_history(tenants[0])[0][1] != ''
+    print("\n Testing a manager leased when the pool is closed is closed when the lease ends")
+    with pool.lease(tenants[0]) as habit_manager:
+        pool.close()
+        assert tenants[0] in pool and tenants[1] not in pool
+        habit_manager.uncheck_habit('habit 0')
+    assert len(pool) == 0 and pool.checkoffs == 0
+    assert load_habit_history(tenants[0]) == [('habit 0', '')]
+
+
+def test_pool_evict_outside_lock(tmp_path, monkeypatch):
+    print("\n Testing a slow eviction doesn't hold up the other databases")
+    slow, fast, other = (make_tenant(tmp_path, name, 1) for name in ("slow", "fast", "other"))
+    armed, started, release = threading.Event(), threading.Event(), threading.Event()
+    flush = HabitManager.flush
+
+    def slow_flush(habit_manager):
+        if habit_manager.database.db_name == slow and armed.is_set() and not release.is_set():
+            started.set()
+            assert release.wait(10)
+        return flush(habit_manager)
+
+    monkeypatch.setattr(HabitManager, 'flush', slow_flush)
+    pool = HabitManagerPool(max_managers = 1)
+    evicted = pool.get(slow)
+    armed.set()
+    thread = threading.Thread(target = pool.get, args = (fast,))
+    thread.start()
+    assert started.wait(10)
+    # the slow manager is being saved, while the other databases are loaded
+    assert pool.get(other).habits.keys() == {'habit 0'}
+    results = []
+    waiter = threading.Thread(target = lambda: results.append(pool.get(slow)))
+    waiter.start()
+    release.set()
+    thread.join()
+    waiter.join()
+    # the manager asked for during its eviction is loaded again once it is closed
+    assert results[0] is not evicted and pool.loads == 4
+    pool.close()
@@ -0,0 +1,45 @@
+import pytest
+from datetime import timedelta
+from src.HabitTrackerCLI import *
+from freezegun import freeze_time
+
+
+def tabulate_menu(habit_manager: HabitManager) -> str:
+    habit_names = list_currently_tracked_habits(list(habit_manager.habits.values()))
+    habit_info_list = list_habit_info(habit_manager.data_as_dict(), habit_names)
+    return tabulate([[x] for x in habit_info_list], headers = ['currently tracked Habits'], tablefmt = 'mixed_grid')
+
+
+def test_main_menu_cache(tmp_path):
+    db_name = str(tmp_path / "test_menu.db")
+    with freeze_time("2024-05-30") as frozen:
+        habit_manager = HabitManager(db_name)
+        menu_cache = MainMenuCache()
+        print("\n Testing the empty table..")
+        assert menu_cache.render(habit_manager) == tabulate_menu(habit_manager)
+        for x in range(20):
+            habit_manager.add_habit(f"test{x}" + "x" * x, periodicity = list(HabitPeriods)[x % 4],
+                                    history = '2024-05-28,2024-05-29' if x % 3 else '')
+        habit_manager.add_habit("テスト")
+        print("\n Testing the table is the same as tabulate..")
+        assert menu_cache.render(habit_manager) == tabulate_menu(habit_manager)
+        assert menu_cache.rendered == 21
+        print("\n Testing nothing is rendered without changes..")
+        assert menu_cache.render(habit_manager) is menu_cache.table
+        assert menu_cache.rendered == 21
+        print("\n Testing only the changed habits are rendered..")
+        habit_manager.check_off_habits(['test1x', 'test2xx'])
+        habit_manager.edit_habit_name('test3xxx', 'test3')
+        habit_manager.edit_habit_periodicity('test4xxxx', HabitPeriods.DAILY)
+        habit_manager.delete_habit('test5xxxxx')
+        assert menu_cache.render(habit_manager) == tabulate_menu(habit_manager)
+        assert menu_cache.rendered == 25
+        print("\n Testing a description change renders only its habit..")
+        habit_manager.edit_habit_description('test1x', 'testy')
+        assert menu_cache.render(habit_manager) == tabulate_menu(habit_manager)
+        assert menu_cache.rendered == 26
+        print("\n Testing all habits are rendered on the next day..")
+        frozen.tick(timedelta(days = 1))
+        assert menu_cache.render(habit_manager) == tabulate_menu(habit_manager)
+        assert menu_cache.rendered == 46
+        habit_manager.close()